@@ -1,37 +1,890 @@
 """
 CRUD для статей: лента, детальная страница, создание, модерация (одобрение/отклонение).
 """
+import atexit
+import base64
+import functools
+import hashlib
 import json
 import os
-import psycopg2
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 
 SCHEMA = "t_p60467862_wild_politics_portal"
 
 CORS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET, POST, PUT, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, X-User-Id",
+    "Access-Control-Allow-Headers": "Content-Type, X-User-Id, If-None-Match",
+    "Access-Control-Expose-Headers": "ETag, X-Cache, Server-Timing",
 }
 
+FEED_DEFAULT_LIMIT = 20
+FEED_MAX_LIMIT = 100
+STREAM_BATCH = int(os.environ.get("STREAM_BATCH", "500"))
+SEARCH_MAX_LIMIT = 50
+SEARCH_MAX_OFFSET = 1000
+MODERATION_BATCH_MAX = int(os.environ.get("MODERATION_BATCH_MAX", "1000"))
+BATCH_MAX_IDS = int(os.environ.get("BATCH_MAX_IDS", "100"))
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 500
+# Строки моложе CHANGES_SETTLE_SECONDS не отдаются: транзакция, записавшая updated_at раньше,
+# может ещё не закоммититься, и токен не должен её обогнать
+CHANGES_SETTLE = f"{float(os.environ.get('CHANGES_SETTLE_SECONDS', '2'))} seconds"
+ARTICLE_FIELDS = frozenset((
+    "id", "title", "content", "excerpt", "channel_id", "channel_name", "channel_color", "channel_icon",
+    "channel_verified", "channel_verification_type", "author_id", "author_name",
+    "status", "views", "is_breaking", "created_at", "comment_count",
+))
+# Тренды: score = ln(1 + просмотры + 5 * одобренные комментарии) + created_at / 45000 (SQL-функция
+# article_trending_refresh в V0011). Слагаемое времени не зависит от NOW(), поэтому пересчитывать нужно
+# только изменившиеся статьи (их id складывает триггер в article_trending_dirty), а порядок остальных
+# остаётся верным. Очередь разбирают попутно, не чаще раза в TRENDING_REFRESH_INTERVAL: записи здесь,
+# сброс буфера просмотров и модерация в comments; `python index.py refresh-trending` — полный разбор.
+# GET /trending не пишет.
+TRENDING_WINDOWS = {"day": "1 day", "week": "7 days", "month": "30 days"}
+TRENDING_REFRESH_BATCH = int(os.environ.get("TRENDING_REFRESH_BATCH", "1000"))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get("TRENDING_REFRESH_INTERVAL", "60"))
+
+ARTICLE_COLUMNS = f"""
+    SELECT a.id, a.title, {{content}}, a.excerpt,
+           a.channel_id, c.name, c.color, c.icon, c.is_verified, c.verification_type,
+           a.author_id, u.first_name, u.username,
+           a.status, a.views, a.is_breaking, a.created_at, a.comment_count, a.updated_at
+    FROM {SCHEMA}.articles a
+    LEFT JOIN {SCHEMA}.channels c ON a.channel_id = c.id
+    LEFT JOIN {SCHEMA}.users u ON a.author_id = u.id
+"""
+FEED_COLUMNS = ARTICLE_COLUMNS.format(content="NULL")
+FEED_ORDER = " ORDER BY a.is_breaking DESC, a.created_at DESC, a.id DESC"
+
+QUERIES = {
+    "is_admin": f"SELECT is_admin FROM {SCHEMA}.users WHERE id=$1",
+    "feed": FEED_COLUMNS + "WHERE a.status = $1" + FEED_ORDER + " LIMIT $2",
+    "feed_after": FEED_COLUMNS + """WHERE a.status = $1
+        AND (a.is_breaking, a.created_at, a.id) < ($2::boolean, $3::timestamp, $4::int)""" + FEED_ORDER + " LIMIT $5",
+    "feed_channel": FEED_COLUMNS + "WHERE a.status = $1 AND a.channel_id = $2" + FEED_ORDER + " LIMIT $3",
+    "feed_channel_after": FEED_COLUMNS + """WHERE a.status = $1 AND a.channel_id = $2
+        AND (a.is_breaking, a.created_at, a.id) < ($3::boolean, $4::timestamp, $5::int)""" + FEED_ORDER + " LIMIT $6",
+    "article_detail": ARTICLE_COLUMNS.format(content="a.content") + "WHERE a.id = $1",
+    "article_changes": FEED_COLUMNS + """WHERE (a.updated_at, a.id) > ($1::timestamp, $2::int)
+        AND a.updated_at < clock_timestamp()::timestamp - $3::interval
+        ORDER BY a.updated_at, a.id LIMIT $4""",
+    "changes_origin": "SELECT clock_timestamp()::timestamp - $1::interval",
+    "article_batch": ARTICLE_COLUMNS.format(content="a.content") + "WHERE a.id = ANY($1::int[])",
+    "article_batch_feed": FEED_COLUMNS + "WHERE a.id = ANY($1::int[])",
+    "article_export": ARTICLE_COLUMNS.format(content="a.content") + "WHERE a.status = $1 ORDER BY a.id",
+    # Ранжирование и отбор страницы по GIN-индексу, ts_headline — только для строк страницы.
+    # Текст экранируется до подсветки, так что snippet безопасно вставлять как HTML.
+    "article_search": f"""
+        WITH hits AS (
+            SELECT a.id, ts_rank(a.search_tsv, q) AS rank, q
+            FROM {SCHEMA}.articles a, websearch_to_tsquery('russian', $2) q
+            WHERE a.status = $1 AND a.search_tsv @@ q
+            ORDER BY rank DESC, a.id DESC
+            LIMIT $3 OFFSET $4
+        )
+        SELECT a.id, a.title, NULL, a.excerpt,
+               a.channel_id, c.name, c.color, c.icon, c.is_verified, c.verification_type,
+               a.author_id, u.first_name, u.username,
+               a.status, a.views, a.is_breaking, a.created_at, a.comment_count,
+               h.rank,
+               ts_headline('russian',
+                           replace(replace(replace(a.content, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'),
+                           h.q, 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10')
+        FROM hits h
+        JOIN {SCHEMA}.articles a ON a.id = h.id
+        LEFT JOIN {SCHEMA}.channels c ON a.channel_id = c.id
+        LEFT JOIN {SCHEMA}.users u ON a.author_id = u.id
+        ORDER BY h.rank DESC, a.id DESC""",
+    "trending": f"""
+        WITH top AS (
+            SELECT article_id, score FROM {SCHEMA}.article_trending
+            WHERE created_at >= NOW() - $1::interval
+            ORDER BY score DESC LIMIT $2
+        )""" + FEED_COLUMNS + "JOIN top t ON t.article_id = a.id WHERE a.status = 'published' ORDER BY t.score DESC",
+    # Пересчёт порции очереди — функция из V0011, её же вызывает функция comments
+    "trending_refresh": f"SELECT * FROM {SCHEMA}.article_trending_refresh($1)",
+    "article_view": f"UPDATE {SCHEMA}.articles SET views=views+1 WHERE id=$1",
+    "article_views_flush": f"""UPDATE {SCHEMA}.articles a SET views = a.views + v.n
+        FROM unnest($1::int[], $2::int[]) AS v(id, n) WHERE a.id = v.id""",
+    "article_insert": f"""INSERT INTO {SCHEMA}.articles (title, content, excerpt, channel_id, author_id, status)
+        VALUES ($1, $2, $3, $4, $5, 'pending') RETURNING id""",
+    "article_lock": f"""SELECT a.status, a.channel_id, (SELECT is_admin FROM {SCHEMA}.users WHERE id=$2)
+        FROM {SCHEMA}.articles a WHERE a.id=$1 FOR UPDATE OF a""",
+    "article_moderate": f"UPDATE {SCHEMA}.articles SET status=$1, is_breaking=$2, updated_at=clock_timestamp() WHERE id=$3",
+    "article_lock_many": f"SELECT id, status, channel_id FROM {SCHEMA}.articles WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE",
+    "article_moderate_many": f"""UPDATE {SCHEMA}.articles a
+        SET status = t.status, is_breaking = t.is_breaking, updated_at = clock_timestamp()
+        FROM unnest($1::int[], $2::text[], $3::boolean[]) AS t(id, status, is_breaking) WHERE a.id = t.id""",
+    "channel_post_count_add_many": f"""UPDATE {SCHEMA}.channels c
+        SET post_count = c.post_count + d.delta, updated_at = clock_timestamp()
+        FROM unnest($1::int[], $2::int[]) AS d(id, delta) WHERE c.id = d.id""",
+    "channel_post_count_add": f"UPDATE {SCHEMA}.channels SET post_count = post_count + $1, updated_at = clock_timestamp() WHERE id=$2",
+}
+
+
+# Трассировка запросов: TRACE_REQUESTS=1 включает тайминги фаз, счётчики запросов и строк,
+# строку лога и заголовок Server-Timing; запросы дольше TRACE_EXPLAIN_MS дополнительно
+# прогоняются через EXPLAIN внутри SAVEPOINT с откатом: чтения — с ANALYZE и BUFFERS,
+# записи — только план, без повторного выполнения.
+# Выключенная трассировка стоит один getattr на threading.local.
+TRACE = os.environ.get("TRACE_REQUESTS", "") == "1"
+TRACE_EXPLAIN_MS = float(os.environ.get("TRACE_EXPLAIN_MS", "0"))
+_trace = threading.local()
+# EXPLAIN ANALYZE выполняет запрос: откат SAVEPOINT убирает строки, но не шаги последовательностей
+# и не время удержания блокировок, поэтому всё, что может писать, объясняется без ANALYZE
+WRITE_SQL = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY)\b|\bnextval\s*\(", re.I)
+
+
+def current_trace():
+    return getattr(_trace, "current", None)
+
+
+class RequestTrace:
+    """Тайминги фаз одного вызова handler: conn, db, json."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.rows = 0
+        self.slow = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def query(self, cur, sql, args, seconds):
+        self.add("db", seconds)
+        self.queries += 1
+        if cur.rowcount > 0:
+            self.rows += cur.rowcount
+        if TRACE_EXPLAIN_MS and seconds * 1000 >= TRACE_EXPLAIN_MS and cur.name is None \
+                and not sql.lstrip().upper().startswith(("PREPARE", "SAVEPOINT", "ROLLBACK", "EXPLAIN")):
+            self.slow.append({
+                "query": sql.strip()[:500],
+                "ms": round(seconds * 1000, 3),
+                "plan": explain(cur.connection, cur.mogrify(sql, args).decode()),
+            })
+
+    def finish(self, response, status):
+        total = (time.perf_counter() - self.started) * 1000
+        timing = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        timing.append(f"total;dur={total:.2f}")
+        if isinstance(response, dict):
+            response["headers"] = {**(response.get("headers") or {}), "Server-Timing": ", ".join(timing)}
+        print(json.dumps({
+            "trace": self.route,
+            "status": status,
+            "total_ms": round(total, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+            "rows": self.rows,
+            "slow": self.slow,
+        }, ensure_ascii=False, default=str))
+
+
+def is_read(sql):
+    # EXECUTE name (...) — смотрим на текст подготовленного запроса из QUERIES
+    m = re.match(r"\s*EXECUTE\s+(\w+)", sql, re.I)
+    text = QUERIES.get(m.group(1), sql) if m else sql
+    return text.lstrip().upper().startswith(("SELECT", "WITH")) and not WRITE_SQL.search(text)
+
+
+def explain(conn, sql):
+    # Отдельный обычный курсор: результат исходного запроса остаётся непрочитанным
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_read(sql) else "FORMAT JSON"
+    cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        cur.execute("SAVEPOINT trace_explain")
+        try:
+            cur.execute(f"EXPLAIN ({options}) " + sql)
+            return cur.fetchone()[0]
+        finally:
+            cur.execute("ROLLBACK TO SAVEPOINT trace_explain")
+    except psycopg2.Error as e:
+        return {"error": str(e).strip()}
+    finally:
+        cur.close()
+
+
+def dumps(obj, **kwargs):
+    trace = current_trace()
+    if trace is None:
+        return json.dumps(obj, **kwargs)
+    start = time.perf_counter()
+    try:
+        return json.dumps(obj, **kwargs)
+    finally:
+        trace.add("json", time.perf_counter() - start)
+
+
+def traced(fn):
+    if not TRACE:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        trace = RequestTrace(f"{event.get('httpMethod', 'GET')} {event.get('path', '/')}")
+        _trace.current = trace
+        response, status = None, 500
+        try:
+            response = fn(event, context)
+            status = response.get("statusCode")
+            return response
+        finally:
+            _trace.current = None
+            trace.finish(response, status)
+
+    return wrapper
+
+
+class ConnPool:
+    """Пул соединений с БД, переживает тёплые вызовы функции."""
+
+    def __init__(self, size, check_after, dsn=None):
+        self.size = size
+        self.check_after = check_after
+        self.dsn = dsn
+        self.idle = []
+        self.opened = 0
+        self.cond = threading.Condition()
+        self.stats = {"checkouts": 0, "waits": 0, "reconnects": 0}
+
+    def _connect(self):
+        load_driver()
+        return psycopg2.connect(self.dsn or os.environ["DATABASE_URL"], connection_factory=PreparedConnection)
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        with self.cond:
+            self.stats["checkouts"] += 1
+            while not self.idle and self.opened >= self.size:
+                self.stats["waits"] += 1
+                self.cond.wait()
+            if self.idle:
+                conn, idle_since = self.idle.pop()
+            else:
+                self.opened += 1
+                conn, idle_since = None, None
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - idle_since > self.check_after and not self._healthy(conn):
+                self._discard(conn)
+                self.stats["reconnects"] += 1
+                conn = self._connect()
+        except Exception:
+            with self.cond:
+                self.opened -= 1
+                self.cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self.cond:
+            if broken or conn.closed:
+                self._discard(conn)
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self):
+        trace = current_trace()
+        start = time.perf_counter() if trace else 0
+        conn = self.acquire()
+        if trace:
+            trace.add("conn", time.perf_counter() - start)
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(conn, broken=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+
+POOL = ConnPool(
+    size=int(os.environ.get("DB_POOL_SIZE", "2")),
+    check_after=float(os.environ.get("DB_POOL_CHECK_AFTER", "30")),
+)
+
 
 def get_conn():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    return POOL.connection()
+
+
+# Реплики для чтения: DATABASE_READ_URL — один DSN или несколько через запятую.
+# GET-маршруты читают с реплик по кругу; недоступная или отстающая больше READ_REPLICA_MAX_LAG
+# секунд пропускается до следующей проверки, а без здоровых реплик чтение идёт с primary.
+# После своей записи (POST/PUT) пользователь READ_YOUR_WRITES_WINDOW секунд читает с primary
+# и мимо общего кэша ответов.
+# Ленты изменений (/changes) всегда читают с primary: токен привязан к часам сервера, и на
+# отстающей реплике он обогнал бы ещё не доехавшие строки.
+READ_REPLICA_MAX_LAG = float(os.environ.get("READ_REPLICA_MAX_LAG", "5"))
+READ_REPLICA_CHECK_INTERVAL = float(os.environ.get("READ_REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_WINDOW = float(os.environ.get("READ_YOUR_WRITES_WINDOW", "10"))
+REPLICA_LAG_QUERY = """SELECT CASE WHEN pg_is_in_recovery()
+    THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"""
+
+
+class ReadReplicas:
+    """Пулы реплик: выбор по кругу, отставание проверяется не чаще раза в check_every секунд."""
+
+    def __init__(self, dsns, max_lag, check_every):
+        self.pools = [ConnPool(size=POOL.size, check_after=POOL.check_after, dsn=dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.state = [{"ok": True, "checked": float("-inf"), "lag": None} for _ in dsns]
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.stats = {"replica": 0, "primary": 0, "read_your_writes": 0, "fallbacks": 0}
+
+    def _order(self):
+        with self.lock:
+            self.turn = (self.turn + 1) % len(self.pools)
+            start = self.turn
+        now = time.monotonic()
+        order = []
+        for k in range(len(self.pools)):
+            i = (start + k) % len(self.pools)
+            if self.state[i]["ok"] or now - self.state[i]["checked"] >= self.check_every:
+                order.append(i)
+        return order
+
+    def _check(self, i, conn):
+        state = self.state[i]
+        if time.monotonic() - state["checked"] < self.check_every:
+            return state["ok"]
+        try:
+            cur = conn.cursor()
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = cur.fetchone()[0]
+            cur.close()
+        except psycopg2.Error:
+            lag = None
+        state["lag"] = float(lag) if lag is not None else None
+        state["ok"] = lag is not None and lag <= self.max_lag
+        state["checked"] = time.monotonic()
+        return state["ok"]
+
+    def _mark_down(self, i):
+        self.state[i].update(ok=False, lag=None, checked=time.monotonic())
+
+    @contextmanager
+    def connection(self, user_id=None):
+        if self.pools:
+            if wrote_recently(user_id):
+                self.stats["read_your_writes"] += 1
+            else:
+                for i in self._order():
+                    served = False
+                    try:
+                        with self.pools[i].connection() as conn:
+                            if not self._check(i, conn):
+                                continue
+                            self.stats["replica"] += 1
+                            served = True
+                            yield conn
+                        return
+                    except psycopg2.OperationalError:
+                        if served:
+                            raise
+                        self._mark_down(i)
+                self.stats["fallbacks"] += 1
+        self.stats["primary"] += 1
+        with POOL.connection() as conn:
+            yield conn
+
+    def snapshot(self):
+        return {**self.stats, "replicas": [{"ok": s["ok"], "lag": s["lag"]} for s in self.state]}
+
+
+REPLICAS = ReadReplicas(
+    [dsn.strip() for dsn in os.environ.get("DATABASE_READ_URL", "").split(",") if dsn.strip()],
+    max_lag=READ_REPLICA_MAX_LAG,
+    check_every=READ_REPLICA_CHECK_INTERVAL,
+)
+
+
+def get_read_conn(user_id=None):
+    return REPLICAS.connection(user_id)
+
 
+def mark_write(user_id):
+    # Метка живёт в хранилище кэша: с CACHE_STORE=redis окно общее для всех экземпляров
+    if user_id and REPLICAS.pools:
+        try:
+            CACHE.store.set(f"ryw:{user_id}", "1", READ_YOUR_WRITES_WINDOW)
+        except Exception:
+            pass
 
-def is_admin(user_id):
+
+def wrote_recently(user_id):
     if not user_id:
         return False
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(f"SELECT is_admin FROM {SCHEMA}.users WHERE id=%s", (user_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row and row[0]
+    try:
+        return CACHE.store.get(f"ryw:{user_id}") is not None
+    except Exception:
+        return True
 
 
-def article_row_to_dict(r):
-    return {
+# psycopg2 импортируется при первом соединении с БД: OPTIONS, 404 и ответы из кэша обходятся без него
+psycopg2 = None
+_driver_lock = threading.Lock()
+
+
+def load_driver():
+    global psycopg2, PreparedConnection, TracingCursor
+    with _driver_lock:
+        if psycopg2 is not None:
+            return psycopg2
+        import psycopg2 as driver
+        import psycopg2.extensions as extensions
+
+        class PreparedConnection(extensions.connection):
+            """Соединение помнит, какие именованные запросы на нём уже подготовлены."""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+                if TRACE:
+                    self.cursor_factory = TracingCursor
+
+        class TracingCursor(extensions.cursor):
+            def execute(self, query, vars=None):
+                trace = current_trace()
+                if trace is None:
+                    return super().execute(query, vars)
+                start = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    trace.query(self, query, vars, time.perf_counter() - start)
+
+        psycopg2 = driver
+        return psycopg2
+
+
+def run(cur, name, args=()):
+    # PREPARE — один раз на соединение, дальше только EXECUTE с готовым планом
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+        conn.prepared.add(name)
+    if args:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+class ViewBuffer:
+    """Буфер просмотров: копит инкременты по id статьи и сбрасывает их одним UPDATE.
+
+    mode: sync — старое поведение, UPDATE в каждом запросе;
+          buffered — сброс по порогу делает запрос, который его превысил;
+          async — сброс в фоновом потоке, чтение не пишет в БД вовсе
+                  (просмотры из буфера теряются, если инстанс убит).
+    """
+
+    def __init__(self, mode, max_pending, max_age):
+        self.mode = mode
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.pending = {}
+        self.count = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def add(self, article_id):
+        with self.lock:
+            self.pending[article_id] = self.pending.get(article_id, 0) + 1
+            self.count += 1
+            return self.count >= self.max_pending or time.monotonic() - self.last_flush >= self.max_age
+
+    def pending_for(self, article_id):
+        return self.pending.get(article_id, 0)
+
+    def _take(self):
+        with self.lock:
+            batch, self.pending, self.count = self.pending, {}, 0
+            self.last_flush = time.monotonic()
+        return batch
+
+    def _restore(self, batch):
+        with self.lock:
+            for article_id, n in batch.items():
+                self.pending[article_id] = self.pending.get(article_id, 0) + n
+                self.count += n
+
+    def flush(self, conn):
+        batch = self._take()
+        if not batch:
+            return 0
+        # Сортировка по id — одинаковый порядок блокировок у параллельных сбросов
+        values = sorted(batch.items())
+        try:
+            cur = conn.cursor()
+            run(cur, "article_views_flush", ([v[0] for v in values], [v[1] for v in values]))
+            conn.commit()
+            cur.close()
+        except Exception:
+            self._restore(batch)
+            raise
+        return len(values)
+
+    def flush_now(self):
+        if self.pending:
+            with get_conn() as conn:
+                self.flush(conn)
+            # Просмотры меняют score: попутный пересчёт трендов (с троттлингом)
+            refresh_trending_after_write()
+
+    def _run(self):
+        while True:
+            time.sleep(self.max_age)
+            try:
+                self.flush_now()
+            except psycopg2.Error:
+                pass
+
+    def start_worker(self):
+        if self.worker is None:
+            with self.lock:
+                if self.worker is None:
+                    self.worker = threading.Thread(target=self._run, daemon=True)
+                    self.worker.start()
+
+
+VIEWS = ViewBuffer(
+    mode=os.environ.get("VIEWS_MODE", "buffered"),
+    max_pending=int(os.environ.get("VIEWS_FLUSH_SIZE", "50")),
+    max_age=float(os.environ.get("VIEWS_FLUSH_INTERVAL", "5")),
+)
+atexit.register(VIEWS.flush_now)
+
+
+def stream_query(conn, name, args=()):
+    # Серверный курсор: строки приходят пачками по STREAM_BATCH, а не всем результатом сразу
+    cur = conn.cursor(name=f"stream_{name}")
+    cur.itersize = STREAM_BATCH
+    # $N -> %(pN)s для psycopg2; литеральный % (LIKE 'a%', форматирование) экранируется заранее
+    sql = re.sub(r"\$(\d+)", r"%(p\1)s", QUERIES[name].replace("%", "%%"))
+    cur.execute(sql, {f"p{i}": v for i, v in enumerate(args, 1)})
+    try:
+        yield from cur
+    finally:
+        cur.close()
+
+
+def encode_rows(rows, to_dict, ndjson=False):
+    # Каждая строка сразу кодируется во фрагмент JSON, тело склеивается одним join в конце.
+    # Пик памяти — фрагменты плюс готовое тело, около двух тел: растёт с размером выгрузки
+    parts = []
+    if ndjson:
+        for r in rows:
+            parts.append(dumps(to_dict(r), ensure_ascii=False))
+            parts.append("\n")
+        return "".join(parts)
+    parts.append("[")
+    for r in rows:
+        parts.append(dumps(to_dict(r), ensure_ascii=False))
+        parts.append(", ")
+    if len(parts) > 1:
+        parts[-1] = "]"
+    else:
+        parts.append("]")
+    return "".join(parts)
+
+
+class MemoryStore:
+    """LRU-хранилище с TTL внутри процесса (по умолчанию)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.gens = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def counters(self, keys):
+        return [self.gens.get(k, 0) for k in keys]
+
+    def incr(self, key):
+        with self.lock:
+            self.gens[key] = self.gens.get(key, 0) + 1
+
+
+class RedisStore:
+    """Общее для всех функций хранилище (CACHE_STORE=redis, CACHE_REDIS_URL)."""
+
+    def __init__(self, url):
+        import redis
+        self.r = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.evictions = 0  # вытесняет сам Redis по maxmemory-policy
+
+    def get(self, key):
+        value = self.r.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.r.set(key, value, ex=max(1, int(ttl)))
+
+    def counters(self, keys):
+        return [int(v or 0) for v in self.r.mget(keys)]
+
+    def incr(self, key):
+        self.r.incr(key)
+
+
+class ResponseCache:
+    """Кэш GET-ответов с ETag. Ключ включает поколения тегов — инвалидация одним incr."""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+    def key(self, route, params, tags):
+        try:
+            gens = self.store.counters([f"gen:{t}" for t in tags])
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{route}?{query}#{'.'.join(map(str, gens))}"
+
+    def get(self, key):
+        value = None
+        if key:
+            try:
+                value = self.store.get(key)
+            except Exception:
+                self.stats["errors"] += 1
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value.split("\n", 1) if value is not None else None
+
+    def put(self, key, body):
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:20]
+        if key:
+            try:
+                self.store.set(key, f"{etag}\n{body}", self.ttl)
+            except Exception:
+                self.stats["errors"] += 1
+        return etag
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            try:
+                self.store.incr(f"gen:{tag}")
+            except Exception:
+                self.stats["errors"] += 1
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "evictions": self.store.evictions,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def make_store():
+    if os.environ.get("CACHE_STORE") == "redis":
+        return RedisStore(os.environ["CACHE_REDIS_URL"])
+    return MemoryStore(int(os.environ.get("CACHE_MAX_ENTRIES", "256")))
+
+
+CACHE = ResponseCache(make_store(), ttl=float(os.environ.get("CACHE_TTL", "30")))
+
+
+def cached_response(event, route, params, tags, build):
+    # В окне read-your-writes общий кэш пропускается: после инвалидации его мог заново заполнить
+    # чужой запрос с отстающей реплики, а build() у пишущего читает с primary
+    user_id = (event.get("headers") or {}).get("X-User-Id")
+    bypass = bool(REPLICAS.pools) and wrote_recently(user_id)
+    key = None if bypass else CACHE.key(route, params, tags)
+    hit = None if bypass else CACHE.get(key)
+    if hit:
+        etag, body = hit
+    else:
+        body = build()
+        etag = CACHE.put(key, body)
+    headers = {**CORS, "ETag": etag, "X-Cache": "BYPASS" if bypass else "HIT" if hit else "MISS"}
+    if (event.get("headers") or {}).get("If-None-Match") == etag:
+        CACHE.stats["not_modified"] += 1
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": body}
+
+
+class AdminCache:
+    """Кэш флага is_admin по user_id с TTL, отрицательные ответы тоже кэшируются (короче)."""
+
+    def __init__(self, ttl, negative_ttl, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _gen(self):
+        # Поколение "admin" в хранилище кэша: auth повышает его при выдаче прав
+        try:
+            return CACHE.store.counters(["gen:admin"])[0]
+        except Exception:
+            return None
+
+    def get(self, user_id):
+        if not user_id:
+            return False
+        entry = self.entries.get(str(user_id))
+        if entry and entry[1] > time.monotonic() and entry[2] == self._gen():
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        return None
+
+    def remember(self, user_id, flag):
+        flag = bool(flag)
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        ttl = self.ttl if flag else self.negative_ttl
+        self.entries[str(user_id)] = (flag, time.monotonic() + ttl, self._gen())
+        return flag
+
+    def load(self, user_id, conn):
+        cur = conn.cursor()
+        run(cur, "is_admin", (user_id,))
+        row = cur.fetchone()
+        cur.close()
+        return self.remember(user_id, row and row[0])
+
+    def check(self, user_id, conn):
+        flag = self.get(user_id)
+        return self.load(user_id, conn) if flag is None else flag
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None}
+
+
+# Кэш флага is_admin: положительный ответ живёт ADMIN_CACHE_TTL секунд, отрицательный —
+# ADMIN_CACHE_NEGATIVE_TTL. С CACHE_STORE=redis выдача прав в auth сбрасывает кэш сразу (gen:admin);
+# без Redis новый админ получает доступ не позже чем через ADMIN_CACHE_NEGATIVE_TTL. Снятие прав
+# делается в БД и ничем не сигналится: оно вступает в силу не позже чем через ADMIN_CACHE_TTL.
+ADMINS = AdminCache(
+    ttl=float(os.environ.get("ADMIN_CACHE_TTL", "60")),
+    negative_ttl=float(os.environ.get("ADMIN_CACHE_NEGATIVE_TTL", "10")),
+)
+
+
+def is_admin(user_id, conn):
+    return ADMINS.check(user_id, conn)
+
+
+INT4_MAX = 2 ** 31 - 1
+
+
+def parse_id(value):
+    # id из JSON или пути: целое или строка ASCII-цифр в диапазоне SERIAL (int4); bool — не id
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if type(value) is int and 0 < value <= INT4_MAX:
+        return value
+    return None
+
+
+def parse_flag(value):
+    # Только true/false или 0/1: строка "false" не должна превращаться в True
+    if isinstance(value, bool):
+        return value
+    if type(value) is int and value in (0, 1):
+        return bool(value)
+    return None
+
+
+def encode_cursor(is_breaking, created_at, article_id):
+    raw = json.dumps([bool(is_breaking), created_at.isoformat(), article_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        is_breaking, created_at, article_id = json.loads(raw)
+        return bool(is_breaking), datetime.fromisoformat(created_at), int(article_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def encode_token(updated_at, row_id):
+    raw = json.dumps([updated_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        updated_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def article_row_to_dict(r, with_content=True):
+    d = {
         "id": r[0], "title": r[1], "content": r[2], "excerpt": r[3],
         "channel_id": r[4], "channel_name": r[5], "channel_color": r[6],
         "channel_icon": r[7], "channel_verified": r[8], "channel_verification_type": r[9],
@@ -41,108 +894,481 @@ def article_row_to_dict(r):
         "created_at": r[16].isoformat() if r[16] else None,
         "comment_count": r[17],
     }
+    if not with_content:
+        del d["content"]
+    return d
 
 
-def handler(event: dict, context) -> dict:
-    if event.get("httpMethod") == "OPTIONS":
-        return {"statusCode": 200, "headers": CORS, "body": ""}
+_last_trending_refresh = 0.0
 
-    method = event.get("httpMethod", "GET")
-    path = event.get("path", "/")
-    user_id = event.get("headers", {}).get("X-User-Id")
-    params = event.get("queryStringParameters") or {}
-    body = json.loads(event.get("body") or "{}")
 
-    BASE_QUERY = f"""
-        SELECT a.id, a.title, a.content, a.excerpt,
-               a.channel_id, c.name, c.color, c.icon, c.is_verified, c.verification_type,
-               a.author_id, u.first_name, u.username,
-               a.status, a.views, a.is_breaking, a.created_at,
-               COUNT(DISTINCT cm.id) FILTER (WHERE cm.status='approved') as comment_count
-        FROM {SCHEMA}.articles a
-        LEFT JOIN {SCHEMA}.channels c ON a.channel_id = c.id
-        LEFT JOIN {SCHEMA}.users u ON a.author_id = u.id
-        LEFT JOIN {SCHEMA}.comments cm ON cm.article_id = a.id
-    """
+def refresh_trending(max_batches=1):
+    # Пересчитывает score статей из article_trending_dirty порциями по TRENDING_REFRESH_BATCH
+    global _last_trending_refresh
+    _last_trending_refresh = time.monotonic()
+    totals = {"touched": 0, "scored": 0, "dropped": 0}
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for _ in range(max_batches):
+            run(cur, "trending_refresh", (TRENDING_REFRESH_BATCH,))
+            touched, scored, dropped = cur.fetchone()
+            conn.commit()
+            totals["touched"] += touched
+            totals["scored"] += scored
+            totals["dropped"] += dropped
+            if touched < TRENDING_REFRESH_BATCH:
+                break
+        cur.close()
+    if totals["scored"] or totals["dropped"]:
+        CACHE.invalidate("trending")
+    return totals
+
+
+def refresh_trending_after_write():
+    # Попутный пересчёт после записи, не чаще раза в TRENDING_REFRESH_INTERVAL на экземпляр
+    if time.monotonic() - _last_trending_refresh <= TRENDING_REFRESH_INTERVAL:
+        return
+    try:
+        refresh_trending()
+    except psycopg2.Error:
+        pass
+
+
+COMMENT_COUNT_DRIFT = f"""
+    SELECT a.id, a.comment_count, COALESCE(x.n, 0)
+    FROM {SCHEMA}.articles a
+    LEFT JOIN (SELECT article_id, COUNT(*) AS n FROM {SCHEMA}.comments
+               WHERE status='approved' GROUP BY article_id) x ON x.article_id = a.id
+    WHERE a.comment_count <> COALESCE(x.n, 0)
+"""
+
+POST_COUNT_DRIFT = f"""
+    SELECT c.id, c.post_count, COALESCE(x.n, 0)
+    FROM {SCHEMA}.channels c
+    LEFT JOIN (SELECT channel_id, COUNT(*) AS n FROM {SCHEMA}.articles
+               WHERE status='published' GROUP BY channel_id) x ON x.channel_id = c.id
+    WHERE c.post_count <> COALESCE(x.n, 0)
+"""
+
+
+def check_counters(conn, fix=False):
+    cur = conn.cursor()
+    cur.execute(COMMENT_COUNT_DRIFT + (" FOR UPDATE OF a" if fix else ""))
+    articles = cur.fetchall()
+    cur.execute(POST_COUNT_DRIFT + (" FOR UPDATE OF c" if fix else ""))
+    channels = cur.fetchall()
+    if fix:
+        for article_id, _, actual in articles:
+            cur.execute(f"UPDATE {SCHEMA}.articles SET comment_count=%s, updated_at=clock_timestamp() WHERE id=%s", (actual, article_id))
+        for channel_id, _, actual in channels:
+            cur.execute(f"UPDATE {SCHEMA}.channels SET post_count=%s, updated_at=clock_timestamp() WHERE id=%s", (actual, channel_id))
+        conn.commit()
+    cur.close()
+    return {
+        "fixed": fix,
+        "articles": [{"id": r[0], "stored": r[1], "actual": r[2]} for r in articles],
+        "channels": [{"id": r[0], "stored": r[1], "actual": r[2]} for r in channels],
+    }
+
+
+class Request:
+    """event вызова: метод, путь и параметры сразу, JSON-тело — при первом обращении к body."""
+
+    def __init__(self, event):
+        self.event = event
+        self.method = event.get("httpMethod", "GET")
+        self.path = event.get("path", "/")
+        self.user_id = (event.get("headers") or {}).get("X-User-Id")
+        self.params = event.get("queryStringParameters") or {}
+        self._body = None
 
-    # GET / — лента публикаций
-    if method == "GET" and path.endswith("/articles") or path.endswith("/articles/"):
-        status_filter = params.get("status", "published")
-        channel_id = params.get("channel_id")
-        where = f"WHERE a.status = '{status_filter}'"
-        if channel_id:
-            where += f" AND a.channel_id = {int(channel_id)}"
-        conn = get_conn()
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = json.loads(self.event.get("body") or "{}")
+        return self._body
+
+
+class Router:
+    """Таблица маршрутов: для каждого метода — скомпилированные при импорте шаблоны конца пути."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, method, pattern):
+        def register(fn):
+            self.routes.setdefault(method, []).append((re.compile(pattern + "$"), fn))
+            return fn
+        return register
+
+    def dispatch(self, req):
+        for pattern, fn in self.routes.get(req.method, ()):
+            match = pattern.search(req.path)
+            if match:
+                return fn(req, **match.groupdict())
+        return None
+
+
+ROUTES = Router()
+
+
+# GET /articles/cache-stats — статистика кэша ответов и кэша прав админа
+@ROUTES.route("GET", r"/cache-stats")
+def cache_stats(req):
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({**CACHE.snapshot(), "admin": ADMINS.snapshot(), "reads": REPLICAS.snapshot()})}
+
+
+# GET /articles — лента публикаций (keyset-пагинация: ?limit=&cursor=)
+@ROUTES.route("GET", r"/articles/?")
+def feed(req):
+    status_filter = req.params.get("status", "published")
+    channel_id = req.params.get("channel_id")
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), FEED_MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else FEED_DEFAULT_LIMIT
+    query, args = "feed", [status_filter]
+    if channel_id:
+        query += "_channel"
+        args.append(int(channel_id))
+    if req.params.get("cursor"):
+        after = decode_cursor(req.params["cursor"])
+        if not after:
+            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid cursor"})}
+        query += "_after"
+        args.extend(after)
+    args.append(limit + 1)
+
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, query, args)
+            rows = cur.fetchall()
+            cur.close()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[15], last[16], last[0])
+        items = [article_row_to_dict(r, with_content=False) for r in rows]
+        return dumps({"items": items, "next_cursor": next_cursor}, ensure_ascii=False)
+
+    key_params = {"status": status_filter, "channel_id": channel_id or "", "limit": limit, "cursor": req.params.get("cursor", "")}
+    return cached_response(req.event, "feed", key_params, ("articles", "comments", "channels"), build)
+
+
+# GET /articles/search?q=&limit=&offset= — полнотекстовый поиск
+@ROUTES.route("GET", r"/search")
+def search(req):
+    q = (req.params.get("q") or "").strip()
+    if not q:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "q required"})}
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), SEARCH_MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else FEED_DEFAULT_LIMIT
+    offset = req.params.get("offset", "")
+    offset = min(int(offset), SEARCH_MAX_OFFSET) if offset.isdigit() else 0
+    status_filter = req.params.get("status", "published")
+
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, "article_search", (status_filter, q, limit + 1, offset))
+            rows = cur.fetchall()
+            cur.close()
+        items = []
+        for r in rows[:limit]:
+            item = article_row_to_dict(r, with_content=False)
+            item["rank"] = r[18]
+            item["snippet"] = r[19]
+            items.append(item)
+        next_offset = offset + limit if len(rows) > limit else None
+        return dumps({"items": items, "next_offset": next_offset}, ensure_ascii=False)
+
+    key_params = {"q": q, "status": status_filter, "limit": limit, "offset": offset}
+    return cached_response(req.event, "search", key_params, ("articles", "comments", "channels"), build)
+
+
+# GET /articles/trending?window=day|week|month&limit= — самые обсуждаемые и читаемые
+@ROUTES.route("GET", r"/trending")
+def trending(req):
+    window = req.params.get("window", "day")
+    if window not in TRENDING_WINDOWS:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid window", "allowed": list(TRENDING_WINDOWS)})}
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), FEED_MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else FEED_DEFAULT_LIMIT
+
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, "trending", (TRENDING_WINDOWS[window], limit))
+            rows = cur.fetchall()
+            cur.close()
+        return dumps({"items": [article_row_to_dict(r, with_content=False) for r in rows]}, ensure_ascii=False)
+
+    return cached_response(req.event, "trending", {"window": window, "limit": limit}, ("trending", "channels"), build)
+
+
+# GET /articles/changes?since=<token>&limit= — статьи, созданные, промодерированные или со сменой
+# comment_count после токена.
+# Без since отдаётся только стартовый токен: его берут до загрузки ленты, дальше применяют дельты по id.
+# Полная строка — только у опубликованных; остальные (на модерации, отклонённые, снятые с
+# публикации) приходят как {id, status}, и клиент убирает такую статью у себя.
+@ROUTES.route("GET", r"/changes")
+def article_changes(req):
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), CHANGES_MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else CHANGES_DEFAULT_LIMIT
+    since = req.params.get("since")
+    after = decode_token(since) if since else None
+    if since and after is None:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid token"})}
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(BASE_QUERY + where + " GROUP BY a.id, c.name, c.color, c.icon, c.is_verified, c.verification_type, u.first_name, u.username ORDER BY a.is_breaking DESC, a.created_at DESC")
-        rows = cur.fetchall()
+        if after is None:
+            run(cur, "changes_origin", (CHANGES_SETTLE,))
+            token, rows = encode_token(cur.fetchone()[0], 0), []
+        else:
+            run(cur, "article_changes", (*after, CHANGES_SETTLE, limit + 1))
+            token, rows = since, cur.fetchall()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps([article_row_to_dict(r) for r in rows], ensure_ascii=False)}
-
-    # GET /articles/{id} — одна статья
-    if method == "GET":
-        parts = path.rstrip("/").split("/")
-        article_id = parts[-1]
-        if article_id.isdigit():
-            conn = get_conn()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        token = encode_token(rows[-1][18], rows[-1][0])
+    items = [article_row_to_dict(r, with_content=False) if r[13] == "published" else {"id": r[0], "status": r[13]}
+             for r in rows]
+    return {"statusCode": 200, "headers": CORS, "body": dumps({"items": items, "next": token, "has_more": has_more}, ensure_ascii=False)}
+
+
+# GET /articles/export?status=&format=ndjson — выгрузка всех статей потоком
+@ROUTES.route("GET", r"/export")
+def export(req):
+    ndjson = req.params.get("format") == "ndjson"
+    with get_read_conn(req.user_id) as conn:
+        rows = stream_query(conn, "article_export", (req.params.get("status", "published"),))
+        body_out = encode_rows(rows, article_row_to_dict, ndjson=ndjson)
+    headers = {**CORS, "Content-Type": "application/x-ndjson" if ndjson else "application/json"}
+    return {"statusCode": 200, "headers": headers, "body": body_out}
+
+
+# GET /articles/batch?ids=1,2,3&fields=id,title&views=1 — несколько статей одним запросом, в порядке ids
+@ROUTES.route("GET", r"/batch")
+def article_batch(req):
+    raw_ids = [x.strip() for x in (req.params.get("ids") or "").split(",") if x.strip()]
+    if not raw_ids:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "ids required"})}
+    ids = [parse_id(x) for x in raw_ids]
+    if None in ids:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid ids"})}
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BATCH_MAX_IDS:
+        return {"statusCode": 413, "headers": CORS, "body": json.dumps({"error": "too many ids", "max": BATCH_MAX_IDS})}
+    fields = [f.strip() for f in (req.params.get("fields") or "").split(",") if f.strip()]
+    if set(fields) - ARTICLE_FIELDS:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid fields", "allowed": sorted(ARTICLE_FIELDS)})}
+    with_content = not fields or "content" in fields
+    count_views = req.params.get("views") == "1"
+
+    def build():
+        sync_views = count_views and VIEWS.mode == "sync"
+        with (get_conn() if sync_views else get_read_conn(req.user_id)) as conn:
             cur = conn.cursor()
-            cur.execute(f"UPDATE {SCHEMA}.articles SET views=views+1 WHERE id=%s", (article_id,))
-            cur.execute(BASE_QUERY + f"WHERE a.id={article_id} GROUP BY a.id, c.name, c.color, c.icon, c.is_verified, c.verification_type, u.first_name, u.username")
-            row = cur.fetchone()
+            if sync_views:
+                # Один UPDATE на все статьи, блокировки — в порядке id
+                ordered = sorted(ids)
+                run(cur, "article_views_flush", (ordered, [1] * len(ordered)))
+            run(cur, "article_batch" if with_content else "article_batch_feed", (ids,))
+            rows = {r[0]: r for r in cur.fetchall()}
             conn.commit()
             cur.close()
-            conn.close()
-            if not row:
-                return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
-            return {"statusCode": 200, "headers": CORS, "body": json.dumps(article_row_to_dict(row), ensure_ascii=False)}
+        if count_views and not sync_views and rows:
+            due = False
+            for article_id in rows:
+                due = VIEWS.add(article_id) or due
+            if VIEWS.mode == "async":
+                VIEWS.start_worker()
+            elif due:
+                VIEWS.flush_now()
+        items = []
+        for article_id in ids:
+            if article_id in rows:
+                item = article_row_to_dict(rows[article_id], with_content=with_content)
+                item["views"] = (item["views"] or 0) + VIEWS.pending_for(article_id)
+                items.append({k: item[k] for k in fields} if fields else item)
+        missing = [i for i in ids if i not in rows]
+        return dumps({"items": items, "missing": missing}, ensure_ascii=False)
 
-    # POST / — создать статью
-    if method == "POST" and (path.endswith("/articles") or path.endswith("/articles/")):
-        if not user_id:
-            return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "unauthorized"})}
-        title = body.get("title", "").strip()
-        content = body.get("content", "").strip()
-        channel_id = body.get("channel_id")
-        if not title or not content or not channel_id:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
-        excerpt = content[:200] + ("..." if len(content) > 200 else "")
-        conn = get_conn()
+    if count_views:
+        return {"statusCode": 200, "headers": CORS, "body": build()}
+    key_params = {"ids": ",".join(map(str, ids)), "fields": ",".join(fields)}
+    return cached_response(req.event, "batch", key_params, ("articles", "comments", "channels"), build)
+
+
+# GET /articles/{id} — одна статья
+@ROUTES.route("GET", r"/(?P<article_id>\d+)/?")
+def article_detail(req, article_id):
+    article_id = int(article_id)
+    # Синхронный счётчик просмотров пишет в той же транзакции — тогда только primary
+    with (get_conn() if VIEWS.mode == "sync" else get_read_conn(req.user_id)) as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"""INSERT INTO {SCHEMA}.articles (title, content, excerpt, channel_id, author_id, status)
-                VALUES (%s, %s, %s, %s, %s, 'pending') RETURNING id""",
-            (title, content, excerpt, channel_id, user_id)
-        )
+        if VIEWS.mode == "sync":
+            run(cur, "article_view", (article_id,))
+        run(cur, "article_detail", (article_id,))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    if row and VIEWS.mode != "sync":
+        due = VIEWS.add(article_id)
+        if VIEWS.mode == "async":
+            VIEWS.start_worker()
+        elif due:
+            VIEWS.flush_now()
+    if not row:
+        return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+    article = article_row_to_dict(row)
+    article["views"] = (article["views"] or 0) + VIEWS.pending_for(article_id)
+    return {"statusCode": 200, "headers": CORS, "body": dumps(article, ensure_ascii=False)}
+
+
+# POST /articles — создать статью
+@ROUTES.route("POST", r"/articles/?")
+def create_article(req):
+    if not req.user_id:
+        return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "unauthorized"})}
+    title = req.body.get("title", "").strip()
+    content = req.body.get("content", "").strip()
+    channel_id = req.body.get("channel_id")
+    if not title or not content or not channel_id:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
+    excerpt = content[:200] + ("..." if len(content) > 200 else "")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        run(cur, "article_insert", (title, content, excerpt, channel_id, req.user_id))
         new_id = cur.fetchone()[0]
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "status": "pending"})}
+    CACHE.invalidate("articles")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "status": "pending"})}
+
+
+# PUT /articles/moderate/batch — массовая модерация: {"items": [{id, action, is_breaking}]}
+@ROUTES.route("PUT", r"/moderate/batch")
+def moderate_batch(req):
+    items = req.body.get("items")
+    if not isinstance(items, list) or not items:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "items required"})}
+    if len(items) > MODERATION_BATCH_MAX:
+        return {"statusCode": 413, "headers": CORS, "body": json.dumps({"error": "too many items", "max": MODERATION_BATCH_MAX})}
+    # Результаты — в порядке items; wanted: id -> (статус, is_breaking, позиция в results)
+    results, wanted = [], {}
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        item_id, action = parse_id(item.get("id")), item.get("action")
+        is_breaking = parse_flag(item.get("is_breaking", False))
+        error = ("invalid id" if item_id is None else "invalid action" if action not in ("approve", "reject")
+                 else "invalid is_breaking" if is_breaking is None else None)
+        if error:
+            results.append({"id": item.get("id"), "result": "invalid", "error": error})
+            continue
+        # Повтор id в пачке — побеждает последний, прежние позиции помечаются duplicate
+        if item_id in wanted:
+            results[wanted[item_id][2]] = {"id": item_id, "result": "duplicate"}
+        wanted[item_id] = ("published" if action == "approve" else "rejected", is_breaking, len(results))
+        results.append(None)
+    with get_conn() as conn:
+        if not is_admin(req.user_id, conn):
+            return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
+        cur = conn.cursor()
+        old = {}
+        if wanted:
+            run(cur, "article_lock_many", (sorted(wanted),))
+            old = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+        found = sorted(set(wanted) & set(old))
+        if found:
+            run(cur, "article_moderate_many", (found, [wanted[i][0] for i in found], [wanted[i][1] for i in found]))
+            deltas = {}
+            for i in found:
+                channel_id = old[i][1]
+                if channel_id:
+                    deltas[channel_id] = deltas.get(channel_id, 0) + (wanted[i][0] == "published") - (old[i][0] == "published")
+            deltas = sorted((k, v) for k, v in deltas.items() if v)
+            if deltas:
+                run(cur, "channel_post_count_add_many", ([d[0] for d in deltas], [d[1] for d in deltas]))
+        conn.commit()
+        cur.close()
+    for i, (status, _, pos) in wanted.items():
+        results[pos] = {"id": i, "result": status if i in old else "not_found"}
+    if found:
+        CACHE.invalidate("articles")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True, "results": results})}
 
-    # PUT /articles/{id}/moderate — одобрить/отклонить
-    if method == "PUT" and "/moderate" in path:
-        if not is_admin(user_id):
+
+# PUT /articles/{id}/moderate — одобрить/отклонить
+@ROUTES.route("PUT", r"(?:/(?P<article_id>[^/]+))?/moderate/?")
+def moderate_article(req, article_id=None):
+    action = req.body.get("action")
+    status = "published" if action == "approve" else "rejected"
+    is_breaking = parse_flag(req.body.get("is_breaking", False))
+    article_id = parse_id(article_id)
+    valid = article_id is not None and action in ("approve", "reject") and is_breaking is not None
+    with get_conn() as conn:
+        admin = ADMINS.get(req.user_id)
+        if admin is None and not valid:
+            admin = ADMINS.load(req.user_id, conn)
+        if admin is False:
             return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
-        parts = path.rstrip("/").split("/")
-        article_id = None
-        for i, p in enumerate(parts):
-            if p == "moderate" and i > 0:
-                article_id = parts[i - 1]
-        action = body.get("action")
-        if not article_id or action not in ("approve", "reject"):
+        if not valid:
             return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid"})}
-        status = "published" if action == "approve" else "rejected"
-        is_breaking = body.get("is_breaking", False)
-        conn = get_conn()
         cur = conn.cursor()
-        cur.execute(
-            f"UPDATE {SCHEMA}.articles SET status=%s, is_breaking=%s WHERE id=%s",
-            (status, is_breaking, article_id)
-        )
+        # При промахе кэша флаг админа приходит тем же запросом, что и блокировка строки
+        run(cur, "article_lock", (article_id, req.user_id))
+        old = cur.fetchone()
+        if admin is None:
+            admin = ADMINS.remember(req.user_id, old[2]) if old else ADMINS.load(req.user_id, conn)
+            if not admin:
+                cur.close()
+                return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
+        run(cur, "article_moderate", (status, is_breaking, article_id))
+        # Счётчик публикаций канала меняется только при входе/выходе из 'published'
+        if old and old[1]:
+            delta = (status == "published") - (old[0] == "published")
+            if delta:
+                run(cur, "channel_post_count_add", (delta, old[1]))
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True, "status": status})}
+    CACHE.invalidate("articles")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True, "status": status})}
+
+
+# PUT /articles/counters — проверить (и с {"fix": true} исправить) расхождение счётчиков
+@ROUTES.route("PUT", r"/counters")
+def counters(req):
+    with get_conn() as conn:
+        if not is_admin(req.user_id, conn):
+            return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
+        drift = check_counters(conn, fix=bool(req.body.get("fix")))
+    if drift["fixed"]:
+        CACHE.invalidate("articles", "comments")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps(drift)}
+
+
+@traced
+def handler(event: dict, context) -> dict:
+    if event.get("httpMethod") == "OPTIONS":
+        return {"statusCode": 200, "headers": CORS, "body": ""}
+    req = Request(event)
+    response = ROUTES.dispatch(req)
+    if response is None:
+        return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+    if req.method in ("POST", "PUT") and response.get("statusCode") == 200:
+        mark_write(req.user_id)
+        refresh_trending_after_write()
+    return response
+
 
-    return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+if __name__ == "__main__":
+    # python index.py [--fix] — проверка счётчиков из консоли
+    # python index.py refresh-trending — пересчёт всей очереди трендов
+    import sys
+    if sys.argv[1:] == ["refresh-trending"]:
+        print(json.dumps(refresh_trending(max_batches=10 ** 6)))
+    else:
+        with get_conn() as conn:
+            print(json.dumps(check_counters(conn, fix="--fix" in sys.argv[1:])))
@@ -2,13 +2,19 @@
 Авторизация через Telegram: верификация данных виджета, регистрация/вход пользователя.
 Также: запрос кода администратора и его проверка.
 """
+import atexit
+import functools
 import json
 import os
 import hashlib
 import hmac
 import random
+import queue
+import re
 import string
-import psycopg2
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 SCHEMA = "t_p60467862_wild_politics_portal"
@@ -17,142 +23,692 @@ CORS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
     "Access-Control-Allow-Headers": "Content-Type, X-User-Id, X-Auth-Token",
+    "Access-Control-Expose-Headers": "Server-Timing",
 }
 
+ADMIN_CODE_RATE_LIMIT = int(os.environ.get("ADMIN_CODE_RATE_LIMIT", "3"))
+ADMIN_CODE_RATE_WINDOW = int(os.environ.get("ADMIN_CODE_RATE_WINDOW", "600"))
+ADMIN_CODES_PURGE_BATCH = int(os.environ.get("ADMIN_CODES_PURGE_BATCH", "1000"))
+ADMIN_CODES_PURGE_INTERVAL = float(os.environ.get("ADMIN_CODES_PURGE_INTERVAL", "300"))
+
+QUERIES = {
+    "user_upsert": f"""INSERT INTO {SCHEMA}.users (telegram_id, username, first_name, last_name, photo_url)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (telegram_id) DO UPDATE
+        SET username=EXCLUDED.username, first_name=EXCLUDED.first_name,
+            last_name=EXCLUDED.last_name, photo_url=EXCLUDED.photo_url
+        RETURNING id, is_admin""",
+    "admin_code_insert": f"INSERT INTO {SCHEMA}.admin_codes (telegram_id, code, expires_at) VALUES ($1, $2, $3)",
+    "admin_code_find": f"""SELECT id FROM {SCHEMA}.admin_codes
+        WHERE telegram_id=$1 AND code=$2 AND used=FALSE AND expires_at > NOW()
+        ORDER BY created_at DESC LIMIT 1""",
+    "admin_code_recent": f"""SELECT COUNT(*) FROM {SCHEMA}.admin_codes
+        WHERE telegram_id=$1 AND used=FALSE AND created_at > NOW() - make_interval(secs => $2)""",
+    # Чистка двумя запросами порциями по $1 строк: короткая транзакция, SKIP LOCKED не ждёт
+    # занятые строки (FOR UPDATE нельзя сочетать с UNION). Использованные идут по
+    # idx_admin_codes_used, просроченные — по idx_admin_codes_unused (expires_at в INCLUDE);
+    # отдельного индекса по expires_at нет, иначе его выбирает поиск кода
+    "admin_code_purge_used": f"""DELETE FROM {SCHEMA}.admin_codes WHERE id IN (
+        SELECT id FROM {SCHEMA}.admin_codes WHERE used = TRUE
+        LIMIT $1 FOR UPDATE SKIP LOCKED)""",
+    "admin_code_purge_expired": f"""DELETE FROM {SCHEMA}.admin_codes WHERE id IN (
+        SELECT id FROM {SCHEMA}.admin_codes WHERE used = FALSE AND expires_at < NOW()
+        LIMIT $1 FOR UPDATE SKIP LOCKED)""",
+    "admin_code_use": f"UPDATE {SCHEMA}.admin_codes SET used=TRUE WHERE id=$1",
+    "dead_letter_insert": f"""INSERT INTO {SCHEMA}.notification_dead_letters (channel, payload, error, attempts)
+        VALUES ($1, $2, $3, $4)""",
+    "user_grant_admin": f"UPDATE {SCHEMA}.users SET is_admin=TRUE WHERE id=$1",
+}
+
+
+# Трассировка запросов: TRACE_REQUESTS=1 включает тайминги фаз, счётчики запросов и строк,
+# строку лога и заголовок Server-Timing; запросы дольше TRACE_EXPLAIN_MS дополнительно
+# прогоняются через EXPLAIN внутри SAVEPOINT с откатом: чтения — с ANALYZE и BUFFERS,
+# записи — только план, без повторного выполнения.
+# Выключенная трассировка стоит один getattr на threading.local.
+TRACE = os.environ.get("TRACE_REQUESTS", "") == "1"
+TRACE_EXPLAIN_MS = float(os.environ.get("TRACE_EXPLAIN_MS", "0"))
+_trace = threading.local()
+# EXPLAIN ANALYZE выполняет запрос: откат SAVEPOINT убирает строки, но не шаги последовательностей
+# и не время удержания блокировок, поэтому всё, что может писать, объясняется без ANALYZE
+WRITE_SQL = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY)\b|\bnextval\s*\(", re.I)
+
+
+def current_trace():
+    return getattr(_trace, "current", None)
+
+
+class RequestTrace:
+    """Тайминги фаз одного вызова handler: conn, db, json."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.rows = 0
+        self.slow = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def query(self, cur, sql, args, seconds):
+        self.add("db", seconds)
+        self.queries += 1
+        if cur.rowcount > 0:
+            self.rows += cur.rowcount
+        if TRACE_EXPLAIN_MS and seconds * 1000 >= TRACE_EXPLAIN_MS and cur.name is None \
+                and not sql.lstrip().upper().startswith(("PREPARE", "SAVEPOINT", "ROLLBACK", "EXPLAIN")):
+            self.slow.append({
+                "query": sql.strip()[:500],
+                "ms": round(seconds * 1000, 3),
+                "plan": explain(cur.connection, cur.mogrify(sql, args).decode()),
+            })
+
+    def finish(self, response, status):
+        total = (time.perf_counter() - self.started) * 1000
+        timing = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        timing.append(f"total;dur={total:.2f}")
+        if isinstance(response, dict):
+            response["headers"] = {**(response.get("headers") or {}), "Server-Timing": ", ".join(timing)}
+        print(json.dumps({
+            "trace": self.route,
+            "status": status,
+            "total_ms": round(total, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+            "rows": self.rows,
+            "slow": self.slow,
+        }, ensure_ascii=False, default=str))
+
+
+def is_read(sql):
+    # EXECUTE name (...) — смотрим на текст подготовленного запроса из QUERIES
+    m = re.match(r"\s*EXECUTE\s+(\w+)", sql, re.I)
+    text = QUERIES.get(m.group(1), sql) if m else sql
+    return text.lstrip().upper().startswith(("SELECT", "WITH")) and not WRITE_SQL.search(text)
+
+
+def explain(conn, sql):
+    # Отдельный обычный курсор: результат исходного запроса остаётся непрочитанным
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_read(sql) else "FORMAT JSON"
+    cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        cur.execute("SAVEPOINT trace_explain")
+        try:
+            cur.execute(f"EXPLAIN ({options}) " + sql)
+            return cur.fetchone()[0]
+        finally:
+            cur.execute("ROLLBACK TO SAVEPOINT trace_explain")
+    except psycopg2.Error as e:
+        return {"error": str(e).strip()}
+    finally:
+        cur.close()
+
+
+def dumps(obj, **kwargs):
+    trace = current_trace()
+    if trace is None:
+        return json.dumps(obj, **kwargs)
+    start = time.perf_counter()
+    try:
+        return json.dumps(obj, **kwargs)
+    finally:
+        trace.add("json", time.perf_counter() - start)
+
+
+def traced(fn):
+    if not TRACE:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        trace = RequestTrace(f"{event.get('httpMethod', 'GET')} {event.get('path', '/')}")
+        _trace.current = trace
+        response, status = None, 500
+        try:
+            response = fn(event, context)
+            status = response.get("statusCode")
+            return response
+        finally:
+            _trace.current = None
+            trace.finish(response, status)
+
+    return wrapper
+
+
+class ConnPool:
+    """Пул соединений с БД, переживает тёплые вызовы функции."""
+
+    def __init__(self, size, check_after, dsn=None):
+        self.size = size
+        self.check_after = check_after
+        self.dsn = dsn
+        self.idle = []
+        self.opened = 0
+        self.cond = threading.Condition()
+        self.stats = {"checkouts": 0, "waits": 0, "reconnects": 0}
+
+    def _connect(self):
+        load_driver()
+        return psycopg2.connect(self.dsn or os.environ["DATABASE_URL"], connection_factory=PreparedConnection)
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        with self.cond:
+            self.stats["checkouts"] += 1
+            while not self.idle and self.opened >= self.size:
+                self.stats["waits"] += 1
+                self.cond.wait()
+            if self.idle:
+                conn, idle_since = self.idle.pop()
+            else:
+                self.opened += 1
+                conn, idle_since = None, None
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - idle_since > self.check_after and not self._healthy(conn):
+                self._discard(conn)
+                self.stats["reconnects"] += 1
+                conn = self._connect()
+        except Exception:
+            with self.cond:
+                self.opened -= 1
+                self.cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self.cond:
+            if broken or conn.closed:
+                self._discard(conn)
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self):
+        trace = current_trace()
+        start = time.perf_counter() if trace else 0
+        conn = self.acquire()
+        if trace:
+            trace.add("conn", time.perf_counter() - start)
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(conn, broken=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+
+POOL = ConnPool(
+    size=int(os.environ.get("DB_POOL_SIZE", "2")),
+    check_after=float(os.environ.get("DB_POOL_CHECK_AFTER", "30")),
+)
+
 
 def get_conn():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    return POOL.connection()
+
+
+# psycopg2 импортируется при первом соединении с БД: OPTIONS, 404 и ответы из кэша обходятся без него
+psycopg2 = None
+_driver_lock = threading.Lock()
+
+
+def load_driver():
+    global psycopg2, PreparedConnection, TracingCursor
+    with _driver_lock:
+        if psycopg2 is not None:
+            return psycopg2
+        import psycopg2 as driver
+        import psycopg2.extensions as extensions
+
+        class PreparedConnection(extensions.connection):
+            """Соединение помнит, какие именованные запросы на нём уже подготовлены."""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+                if TRACE:
+                    self.cursor_factory = TracingCursor
+
+        class TracingCursor(extensions.cursor):
+            def execute(self, query, vars=None):
+                trace = current_trace()
+                if trace is None:
+                    return super().execute(query, vars)
+                start = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    trace.query(self, query, vars, time.perf_counter() - start)
+
+        psycopg2 = driver
+        return psycopg2
+
+
+def run(cur, name, args=()):
+    # PREPARE — один раз на соединение, дальше только EXECUTE с готовым планом
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+        conn.prepared.add(name)
+    if args:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+http_client = None
+
+
+class TelegramNotifier:
+    """Очередь исходящих сообщений в Telegram.
+
+    Сообщения отправляет фоновый поток через keep-alive соединение с таймаутом;
+    временные ошибки повторяются с экспоненциальной задержкой, после последней
+    попытки сообщение записывается в notification_dead_letters.
+    """
+
+    def __init__(self, base_url, timeout, retries, backoff):
+        self.base_url = base_url
+        self.base = None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = queue.Queue()
+        self.conn = None
+        self.worker = None
+        self.lock = threading.Lock()
+        self.stats = {"queued": 0, "sent": 0, "retries": 0, "dead": 0}
+
+    def send(self, chat_id, text):
+        self.stats["queued"] += 1
+        self.queue.put({"chat_id": chat_id, "text": text, "parse_mode": "Markdown"})
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+
+    def drain(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _connection(self):
+        # http.client тянет за собой email и ssl (десятки мс импорта): грузим с первым сообщением,
+        # а не на холодном старте функции
+        global http_client
+        if http_client is None:
+            import http.client as http_client
+        if self.base is None:
+            import urllib.parse
+            self.base = urllib.parse.urlsplit(self.base_url)
+        if self.conn is None:
+            cls = http_client.HTTPSConnection if self.base.scheme == "https" else http_client.HTTPConnection
+            self.conn = cls(self.base.netloc, timeout=self.timeout)
+        return self.conn
+
+    def _reset(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _post(self, message):
+        token = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+        conn = self._connection()
+        conn.request(
+            "POST", f"{self.base.path.rstrip('/')}/bot{token}/sendMessage",
+            body=json.dumps(message).encode(), headers={"Content-Type": "application/json"},
+        )
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status == 200:
+            return None, None
+        try:
+            retry_after = json.loads(data).get("parameters", {}).get("retry_after")
+        except ValueError:
+            retry_after = None
+        # 429 и 5xx — временные, остальные 4xx повторять бессмысленно
+        retryable = resp.status == 429 or resp.status >= 500
+        return f"HTTP {resp.status}: {data[:200].decode(errors='replace')}", retry_after if retryable else False
+
+    def _deliver(self, message):
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+            try:
+                error, retry_after = self._post(message)
+            except (OSError, http_client.HTTPException) as e:
+                self._reset()
+                error, retry_after = repr(e), None
+            if error is None:
+                self.stats["sent"] += 1
+                return
+            if retry_after is False or attempt == self.retries:
+                break
+            time.sleep(retry_after or self.backoff * 2 ** attempt)
+        self._dead_letter(message, error, attempt + 1)
+
+    def _dead_letter(self, message, error, attempts):
+        self.stats["dead"] += 1
+        try:
+            with get_conn() as conn:
+                cur = conn.cursor()
+                run(cur, "dead_letter_insert", ("telegram", json.dumps(message, ensure_ascii=False), error, attempts))
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            # Поток доставки не должен падать из-за записи в dead letters; сообщение хотя бы в логе
+            print(json.dumps({"dead_letter_failed": message.get("chat_id"), "error": repr(e)}))
+
+    def _run(self):
+        # Любая неожиданная ошибка (ответ Telegram не того вида, баг) стоит одного сообщения,
+        # а не потока: self.worker остаётся заданным, и умерший поток никто бы не перезапустил
+        while True:
+            message = self.queue.get()
+            try:
+                self._deliver(message)
+            except Exception as e:
+                try:
+                    self._reset()
+                except Exception:
+                    self.conn = None
+                self._dead_letter(message, repr(e), 1)
+            finally:
+                self.queue.task_done()
+
+
+NOTIFIER = TelegramNotifier(
+    base_url=os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org"),
+    timeout=float(os.environ.get("TELEGRAM_TIMEOUT", "5")),
+    retries=int(os.environ.get("TELEGRAM_RETRIES", "3")),
+    backoff=float(os.environ.get("TELEGRAM_BACKOFF", "0.5")),
+)
+atexit.register(NOTIFIER.drain)
+
+
+_last_purge = 0.0
+
+
+def purge_admin_codes(max_batches=1):
+    # Удаляет использованные и просроченные коды порциями по ADMIN_CODES_PURGE_BATCH
+    global _last_purge
+    _last_purge = time.monotonic()
+    deleted = 0
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for _ in range(max_batches):
+            full = False
+            for name in ("admin_code_purge_used", "admin_code_purge_expired"):
+                run(cur, name, (ADMIN_CODES_PURGE_BATCH,))
+                conn.commit()
+                deleted += cur.rowcount
+                full = full or cur.rowcount >= ADMIN_CODES_PURGE_BATCH
+            if not full:
+                break
+        cur.close()
+    return deleted
+
+
+def invalidate_admin_cache():
+    # Кэш прав админа в articles/channels/comments сбрасывается через общий Redis,
+    # без него отрицательный ответ там живёт не дольше ADMIN_CACHE_NEGATIVE_TTL
+    if os.environ.get("CACHE_STORE") != "redis":
+        return
+    import redis
+    try:
+        redis.Redis.from_url(os.environ["CACHE_REDIS_URL"], socket_timeout=0.2).incr("gen:admin")
+    except redis.RedisError:
+        pass
+
+
+TELEGRAM_AUTH_MAX_AGE = int(os.environ.get("TELEGRAM_AUTH_MAX_AGE", "86400"))
+TELEGRAM_SEEN_MAX = 4096
+TELEGRAM_HASH = re.compile(r"[0-9a-f]{64}")
+
+_telegram_mac = (None, None)
+# Кэш повторов — два поколения по TELEGRAM_SEEN_MAX / 2: заполненное текущее становится прежним,
+# прежнее выбрасывается целиком, так что вставка не платит за вытеснение по одному
+# Общий с потоком уведомлений процесс: поколения меняются (вставка, смена, сброс) только под замком
+_telegram_seen = [{}, {}]
+_telegram_lock = threading.Lock()
+
+
+def forget_telegram_logins():
+    with _telegram_lock:
+        _telegram_seen[:] = [{}, {}]
+
+
+def telegram_mac(token):
+    # Ключ HMAC (sha256(token) и подготовка ipad/opad) готовится один раз на токен, на запрос — copy();
+    # смена токена пересчитывает ключ и сбрасывает кэш повторов
+    global _telegram_mac
+    if _telegram_mac[0] != token:
+        _telegram_mac = (token, hmac.new(hashlib.sha256(token.encode()).digest(), digestmod=hashlib.sha256))
+        forget_telegram_logins()
+    return _telegram_mac[1]
 
 
 def verify_telegram_data(data: dict) -> bool:
     token = os.environ.get("TELEGRAM_BOT_TOKEN", "")
     if not token:
         return False
-    check_hash = data.pop("hash", "")
-    data_check_arr = sorted([f"{k}={v}" for k, v in data.items()])
-    data_check_string = "\n".join(data_check_arr)
-    secret_key = hashlib.sha256(token.encode()).digest()
-    computed = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-    return computed == check_hash
+    try:
+        auth_date = int(data.get("auth_date", 0))
+    except (TypeError, ValueError):
+        return False
+    if time.time() - auth_date > TELEGRAM_AUTH_MAX_AGE:
+        return False
+    mac = telegram_mac(token)
+    check_hash = data.get("hash")
+    # Только hex sha256 в нижнем регистре: список не годится ключом dict, а не-ASCII строка
+    # роняет compare_digest — оба случая должны давать 401, а не 500
+    if not isinstance(check_hash, str) or not TELEGRAM_HASH.fullmatch(check_hash):
+        return False
+    # Повтор тех же данных (в пределах окна auth_date): поиск по hash и сравнение словарей, без HMAC.
+    # Чтение без замка: пара поколений берётся одной распаковкой, dict.get атомарен под GIL
+    current, previous = _telegram_seen
+    if (current.get(check_hash) or previous.get(check_hash)) == data:
+        return True
+    mac = mac.copy()
+    mac.update("\n".join(f"{k}={data[k]}" for k in sorted(data) if k != "hash").encode())
+    if not hmac.compare_digest(mac.hexdigest(), check_hash):
+        return False
+    with _telegram_lock:
+        if len(_telegram_seen[0]) >= TELEGRAM_SEEN_MAX // 2:
+            _telegram_seen[:] = [{}, _telegram_seen[0]]
+        _telegram_seen[0][check_hash] = dict(data)
+    return True
 
 
-def handler(event: dict, context) -> dict:
-    if event.get("httpMethod") == "OPTIONS":
-        return {"statusCode": 200, "headers": CORS, "body": ""}
+class Request:
+    """event вызова: метод, путь и параметры сразу, JSON-тело — при первом обращении к body."""
 
-    path = event.get("path", "/")
-    body = json.loads(event.get("body") or "{}")
+    def __init__(self, event):
+        self.event = event
+        self.method = event.get("httpMethod", "GET")
+        self.path = event.get("path", "/")
+        self.user_id = (event.get("headers") or {}).get("X-User-Id")
+        self.params = event.get("queryStringParameters") or {}
+        self._body = None
 
-    # POST /auth/telegram — вход через Telegram Widget
-    if path.endswith("/telegram"):
-        tg = dict(body)
-        tg_id = tg.get("id")
-        if not tg_id:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "no id"})}
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = json.loads(self.event.get("body") or "{}")
+        return self._body
 
-        # Верифицируем данные от Telegram
-        valid = verify_telegram_data(tg)
-        # В dev режиме без токена принимаем как есть
-        if not valid and os.environ.get("TELEGRAM_BOT_TOKEN"):
-            return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "invalid telegram data"})}
 
-        conn = get_conn()
+class Router:
+    """Таблица маршрутов: для каждого метода — скомпилированные при импорте шаблоны конца пути."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, method, pattern):
+        def register(fn):
+            self.routes.setdefault(method, []).append((re.compile(pattern + "$"), fn))
+            return fn
+        return register
+
+    def dispatch(self, req):
+        for pattern, fn in self.routes.get(req.method, ()):
+            match = pattern.search(req.path)
+            if match:
+                return fn(req, **match.groupdict())
+        return None
+
+
+ROUTES = Router()
+
+
+# POST /auth/telegram — вход через Telegram Widget
+@ROUTES.route("POST", r"/telegram")
+def telegram_login(req):
+    tg_id = req.body.get("id")
+    if not tg_id:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "no id"})}
+
+    # Верифицируем данные от Telegram
+    valid = verify_telegram_data(req.body)
+    # В dev режиме без токена принимаем как есть
+    if not valid and os.environ.get("TELEGRAM_BOT_TOKEN"):
+        return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "invalid telegram data"})}
+
+    with get_conn() as conn:
         cur = conn.cursor()
         # Upsert пользователя
-        cur.execute(
-            f"""INSERT INTO {SCHEMA}.users (telegram_id, username, first_name, last_name, photo_url)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (telegram_id) DO UPDATE
-                SET username=EXCLUDED.username, first_name=EXCLUDED.first_name,
-                    last_name=EXCLUDED.last_name, photo_url=EXCLUDED.photo_url
-                RETURNING id, is_admin""",
-            (tg_id, body.get("username"), body.get("first_name"), body.get("last_name"), body.get("photo_url"))
-        )
+        run(cur, "user_upsert", (tg_id, req.body.get("username"), req.body.get("first_name"), req.body.get("last_name"), req.body.get("photo_url")))
         row = cur.fetchone()
         conn.commit()
         cur.close()
-        conn.close()
-
-        return {
-            "statusCode": 200,
-            "headers": CORS,
-            "body": json.dumps({
-                "user_id": row[0],
-                "telegram_id": tg_id,
-                "username": body.get("username"),
-                "first_name": body.get("first_name"),
-                "last_name": body.get("last_name"),
-                "photo_url": body.get("photo_url"),
-                "is_admin": row[1],
-            })
-        }
 
-    # POST /auth/request-admin-code — запросить код для входа как админ
-    if path.endswith("/request-admin-code"):
-        tg_id = body.get("telegram_id")
-        if not tg_id:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "no telegram_id"})}
+    return {
+        "statusCode": 200,
+        "headers": CORS,
+        "body": dumps({
+            "user_id": row[0],
+            "telegram_id": tg_id,
+            "username": req.body.get("username"),
+            "first_name": req.body.get("first_name"),
+            "last_name": req.body.get("last_name"),
+            "photo_url": req.body.get("photo_url"),
+            "is_admin": row[1],
+        })
+    }
+
 
-        # Проверяем что это разрешённый администратор
-        admin_ids_str = os.environ.get("ADMIN_TELEGRAM_IDS", "")
-        allowed = [int(x.strip()) for x in admin_ids_str.split(",") if x.strip().isdigit()]
-        if int(tg_id) not in allowed:
-            return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "not allowed"})}
+# POST /auth/request-admin-code — запросить код для входа как админ
+@ROUTES.route("POST", r"/request-admin-code")
+def request_admin_code(req):
+    tg_id = req.body.get("telegram_id")
+    if not tg_id:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "no telegram_id"})}
 
-        code = "".join(random.choices(string.digits, k=6))
-        expires = datetime.utcnow() + timedelta(minutes=10)
+    # Проверяем что это разрешённый администратор
+    admin_ids_str = os.environ.get("ADMIN_TELEGRAM_IDS", "")
+    allowed = [int(x.strip()) for x in admin_ids_str.split(",") if x.strip().isdigit()]
+    if int(tg_id) not in allowed:
+        return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "not allowed"})}
 
-        conn = get_conn()
+    code = "".join(random.choices(string.digits, k=6))
+    expires = datetime.utcnow() + timedelta(minutes=10)
+
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"INSERT INTO {SCHEMA}.admin_codes (telegram_id, code, expires_at) VALUES (%s, %s, %s)",
-            (tg_id, code, expires)
-        )
+        run(cur, "admin_code_recent", (tg_id, ADMIN_CODE_RATE_WINDOW))
+        if cur.fetchone()[0] >= ADMIN_CODE_RATE_LIMIT:
+            cur.close()
+            return {"statusCode": 429, "headers": CORS, "body": json.dumps({"error": "too many requests"})}
+        run(cur, "admin_code_insert", (tg_id, code, expires))
         conn.commit()
         cur.close()
-        conn.close()
 
-        # Отправляем код через Telegram бота
-        token = os.environ.get("TELEGRAM_BOT_TOKEN", "")
-        if token:
-            import urllib.request
-            msg = f"🔐 Ваш код администратора ГТРК ОГФ: *{code}*\n\nДействителен 10 минут."
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            payload = json.dumps({"chat_id": tg_id, "text": msg, "parse_mode": "Markdown"}).encode()
-            req = urllib.request.Request(url, data=payload, headers={"Content-Type": "application/json"})
-            urllib.request.urlopen(req)
-
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"sent": True})}
-
-    # POST /auth/verify-admin-code — проверить код администратора
-    if path.endswith("/verify-admin-code"):
-        tg_id = body.get("telegram_id")
-        code = body.get("code", "").strip()
-        user_id = body.get("user_id")
-        if not tg_id or not code:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
-
-        conn = get_conn()
+    # Попутная чистка таблицы не чаще раза в ADMIN_CODES_PURGE_INTERVAL
+    if time.monotonic() - _last_purge > ADMIN_CODES_PURGE_INTERVAL:
+        try:
+            purge_admin_codes()
+        except psycopg2.Error:
+            pass
+
+    # Отправляем код через Telegram бота — в фоне, ответ не ждёт Telegram
+    if os.environ.get("TELEGRAM_BOT_TOKEN"):
+        NOTIFIER.send(tg_id, f"🔐 Ваш код администратора ГТРК ОГФ: *{code}*\n\nДействителен 10 минут.")
+
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"sent": True})}
+
+
+# POST /auth/verify-admin-code — проверить код администратора
+@ROUTES.route("POST", r"/verify-admin-code")
+def verify_admin_code(req):
+    tg_id = req.body.get("telegram_id")
+    code = req.body.get("code", "").strip()
+    user_id = req.body.get("user_id")
+    if not tg_id or not code:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
+
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"""SELECT id FROM {SCHEMA}.admin_codes
-                WHERE telegram_id=%s AND code=%s AND used=FALSE AND expires_at > NOW()
-                ORDER BY created_at DESC LIMIT 1""",
-            (tg_id, code)
-        )
+        run(cur, "admin_code_find", (tg_id, code))
         row = cur.fetchone()
         if not row:
             cur.close()
-            conn.close()
             return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "invalid or expired code"})}
 
-        cur.execute(f"UPDATE {SCHEMA}.admin_codes SET used=TRUE WHERE id=%s", (row[0],))
+        run(cur, "admin_code_use", (row[0],))
         if user_id:
-            cur.execute(f"UPDATE {SCHEMA}.users SET is_admin=TRUE WHERE id=%s", (user_id,))
+            run(cur, "user_grant_admin", (user_id,))
         conn.commit()
         cur.close()
-        conn.close()
+    if user_id:
+        invalidate_admin_cache()
+
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"is_admin": True})}
+
+
+@traced
+def handler(event: dict, context) -> dict:
+    if event.get("httpMethod") == "OPTIONS":
+        return {"statusCode": 200, "headers": CORS, "body": ""}
+    response = ROUTES.dispatch(Request(event))
+    if response is None:
+        return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+    return response
 
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"is_admin": True})}
 
-    return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+if __name__ == "__main__":
+    # python index.py purge-admin-codes — полная чистка admin_codes порциями
+    import sys
+    if sys.argv[1:] == ["purge-admin-codes"]:
+        print(json.dumps({"deleted": purge_admin_codes(max_batches=10 ** 6)}))
@@ -1,16 +1,31 @@
 """
 CRUD для каналов: получить список, создать канал, верифицировать канал (только для админов).
 """
+import base64
+import functools
+import hashlib
 import json
 import os
-import psycopg2
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 
 SCHEMA = "t_p60467862_wild_politics_portal"
 
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 500
+# Строки моложе CHANGES_SETTLE_SECONDS не отдаются: транзакция, записавшая updated_at раньше,
+# может ещё не закоммититься, и токен не должен её обогнать
+CHANGES_SETTLE = f"{float(os.environ.get('CHANGES_SETTLE_SECONDS', '2'))} seconds"
+
 CORS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET, POST, PUT, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, X-User-Id",
+    "Access-Control-Allow-Headers": "Content-Type, X-User-Id, If-None-Match",
+    "Access-Control-Expose-Headers": "ETag, X-Cache, Server-Timing",
 }
 
 VERIFICATION_TYPES = {
@@ -20,114 +35,785 @@ VERIFICATION_TYPES = {
     "news": "Новостной",
 }
 
+CHANNEL_COLUMNS = f"""
+    SELECT c.id, c.name, c.description, c.icon, c.color,
+           c.is_verified, c.verification_type, c.created_at,
+           u.first_name, u.username, c.post_count, c.updated_at
+    FROM {SCHEMA}.channels c
+    LEFT JOIN {SCHEMA}.users u ON c.created_by = u.id
+"""
+
+QUERIES = {
+    "is_admin": f"SELECT is_admin FROM {SCHEMA}.users WHERE id=$1",
+    "channel_list": CHANNEL_COLUMNS + "ORDER BY c.is_verified DESC, c.created_at ASC",
+    "channel_changes": CHANNEL_COLUMNS + """WHERE (c.updated_at, c.id) > ($1::timestamp, $2::int)
+        AND c.updated_at < clock_timestamp()::timestamp - $3::interval
+        ORDER BY c.updated_at, c.id LIMIT $4""",
+    "changes_origin": "SELECT clock_timestamp()::timestamp - $1::interval",
+    "channel_insert": f"""INSERT INTO {SCHEMA}.channels (name, description, icon, color, created_by)
+        VALUES ($1, $2, $3, $4, $5) RETURNING id""",
+    "channel_verify": f"""UPDATE {SCHEMA}.channels
+        SET is_verified=TRUE, verification_type=$1, updated_at=clock_timestamp() WHERE id=$2""",
+    "channel_unverify": f"""UPDATE {SCHEMA}.channels
+        SET is_verified=FALSE, verification_type=NULL, updated_at=clock_timestamp() WHERE id=$1""",
+}
+
+
+# Трассировка запросов: TRACE_REQUESTS=1 включает тайминги фаз, счётчики запросов и строк,
+# строку лога и заголовок Server-Timing; запросы дольше TRACE_EXPLAIN_MS дополнительно
+# прогоняются через EXPLAIN внутри SAVEPOINT с откатом: чтения — с ANALYZE и BUFFERS,
+# записи — только план, без повторного выполнения.
+# Выключенная трассировка стоит один getattr на threading.local.
+TRACE = os.environ.get("TRACE_REQUESTS", "") == "1"
+TRACE_EXPLAIN_MS = float(os.environ.get("TRACE_EXPLAIN_MS", "0"))
+_trace = threading.local()
+# EXPLAIN ANALYZE выполняет запрос: откат SAVEPOINT убирает строки, но не шаги последовательностей
+# и не время удержания блокировок, поэтому всё, что может писать, объясняется без ANALYZE
+WRITE_SQL = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY)\b|\bnextval\s*\(", re.I)
+
+
+def current_trace():
+    return getattr(_trace, "current", None)
+
+
+class RequestTrace:
+    """Тайминги фаз одного вызова handler: conn, db, json."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.rows = 0
+        self.slow = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def query(self, cur, sql, args, seconds):
+        self.add("db", seconds)
+        self.queries += 1
+        if cur.rowcount > 0:
+            self.rows += cur.rowcount
+        if TRACE_EXPLAIN_MS and seconds * 1000 >= TRACE_EXPLAIN_MS and cur.name is None \
+                and not sql.lstrip().upper().startswith(("PREPARE", "SAVEPOINT", "ROLLBACK", "EXPLAIN")):
+            self.slow.append({
+                "query": sql.strip()[:500],
+                "ms": round(seconds * 1000, 3),
+                "plan": explain(cur.connection, cur.mogrify(sql, args).decode()),
+            })
+
+    def finish(self, response, status):
+        total = (time.perf_counter() - self.started) * 1000
+        timing = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        timing.append(f"total;dur={total:.2f}")
+        if isinstance(response, dict):
+            response["headers"] = {**(response.get("headers") or {}), "Server-Timing": ", ".join(timing)}
+        print(json.dumps({
+            "trace": self.route,
+            "status": status,
+            "total_ms": round(total, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+            "rows": self.rows,
+            "slow": self.slow,
+        }, ensure_ascii=False, default=str))
+
+
+def is_read(sql):
+    # EXECUTE name (...) — смотрим на текст подготовленного запроса из QUERIES
+    m = re.match(r"\s*EXECUTE\s+(\w+)", sql, re.I)
+    text = QUERIES.get(m.group(1), sql) if m else sql
+    return text.lstrip().upper().startswith(("SELECT", "WITH")) and not WRITE_SQL.search(text)
+
+
+def explain(conn, sql):
+    # Отдельный обычный курсор: результат исходного запроса остаётся непрочитанным
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_read(sql) else "FORMAT JSON"
+    cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        cur.execute("SAVEPOINT trace_explain")
+        try:
+            cur.execute(f"EXPLAIN ({options}) " + sql)
+            return cur.fetchone()[0]
+        finally:
+            cur.execute("ROLLBACK TO SAVEPOINT trace_explain")
+    except psycopg2.Error as e:
+        return {"error": str(e).strip()}
+    finally:
+        cur.close()
+
+
+def dumps(obj, **kwargs):
+    trace = current_trace()
+    if trace is None:
+        return json.dumps(obj, **kwargs)
+    start = time.perf_counter()
+    try:
+        return json.dumps(obj, **kwargs)
+    finally:
+        trace.add("json", time.perf_counter() - start)
+
+
+def traced(fn):
+    if not TRACE:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        trace = RequestTrace(f"{event.get('httpMethod', 'GET')} {event.get('path', '/')}")
+        _trace.current = trace
+        response, status = None, 500
+        try:
+            response = fn(event, context)
+            status = response.get("statusCode")
+            return response
+        finally:
+            _trace.current = None
+            trace.finish(response, status)
+
+    return wrapper
+
+
+class ConnPool:
+    """Пул соединений с БД, переживает тёплые вызовы функции."""
+
+    def __init__(self, size, check_after, dsn=None):
+        self.size = size
+        self.check_after = check_after
+        self.dsn = dsn
+        self.idle = []
+        self.opened = 0
+        self.cond = threading.Condition()
+        self.stats = {"checkouts": 0, "waits": 0, "reconnects": 0}
+
+    def _connect(self):
+        load_driver()
+        return psycopg2.connect(self.dsn or os.environ["DATABASE_URL"], connection_factory=PreparedConnection)
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        with self.cond:
+            self.stats["checkouts"] += 1
+            while not self.idle and self.opened >= self.size:
+                self.stats["waits"] += 1
+                self.cond.wait()
+            if self.idle:
+                conn, idle_since = self.idle.pop()
+            else:
+                self.opened += 1
+                conn, idle_since = None, None
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - idle_since > self.check_after and not self._healthy(conn):
+                self._discard(conn)
+                self.stats["reconnects"] += 1
+                conn = self._connect()
+        except Exception:
+            with self.cond:
+                self.opened -= 1
+                self.cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self.cond:
+            if broken or conn.closed:
+                self._discard(conn)
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self):
+        trace = current_trace()
+        start = time.perf_counter() if trace else 0
+        conn = self.acquire()
+        if trace:
+            trace.add("conn", time.perf_counter() - start)
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(conn, broken=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+
+POOL = ConnPool(
+    size=int(os.environ.get("DB_POOL_SIZE", "2")),
+    check_after=float(os.environ.get("DB_POOL_CHECK_AFTER", "30")),
+)
+
 
 def get_conn():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    return POOL.connection()
+
+
+# Реплики для чтения: DATABASE_READ_URL — один DSN или несколько через запятую.
+# GET-маршруты читают с реплик по кругу; недоступная или отстающая больше READ_REPLICA_MAX_LAG
+# секунд пропускается до следующей проверки, а без здоровых реплик чтение идёт с primary.
+# После своей записи (POST/PUT) пользователь READ_YOUR_WRITES_WINDOW секунд читает с primary
+# и мимо общего кэша ответов.
+# Ленты изменений (/changes) всегда читают с primary: токен привязан к часам сервера, и на
+# отстающей реплике он обогнал бы ещё не доехавшие строки.
+READ_REPLICA_MAX_LAG = float(os.environ.get("READ_REPLICA_MAX_LAG", "5"))
+READ_REPLICA_CHECK_INTERVAL = float(os.environ.get("READ_REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_WINDOW = float(os.environ.get("READ_YOUR_WRITES_WINDOW", "10"))
+REPLICA_LAG_QUERY = """SELECT CASE WHEN pg_is_in_recovery()
+    THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"""
+
+
+class ReadReplicas:
+    """Пулы реплик: выбор по кругу, отставание проверяется не чаще раза в check_every секунд."""
+
+    def __init__(self, dsns, max_lag, check_every):
+        self.pools = [ConnPool(size=POOL.size, check_after=POOL.check_after, dsn=dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.state = [{"ok": True, "checked": float("-inf"), "lag": None} for _ in dsns]
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.stats = {"replica": 0, "primary": 0, "read_your_writes": 0, "fallbacks": 0}
+
+    def _order(self):
+        with self.lock:
+            self.turn = (self.turn + 1) % len(self.pools)
+            start = self.turn
+        now = time.monotonic()
+        order = []
+        for k in range(len(self.pools)):
+            i = (start + k) % len(self.pools)
+            if self.state[i]["ok"] or now - self.state[i]["checked"] >= self.check_every:
+                order.append(i)
+        return order
+
+    def _check(self, i, conn):
+        state = self.state[i]
+        if time.monotonic() - state["checked"] < self.check_every:
+            return state["ok"]
+        try:
+            cur = conn.cursor()
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = cur.fetchone()[0]
+            cur.close()
+        except psycopg2.Error:
+            lag = None
+        state["lag"] = float(lag) if lag is not None else None
+        state["ok"] = lag is not None and lag <= self.max_lag
+        state["checked"] = time.monotonic()
+        return state["ok"]
+
+    def _mark_down(self, i):
+        self.state[i].update(ok=False, lag=None, checked=time.monotonic())
+
+    @contextmanager
+    def connection(self, user_id=None):
+        if self.pools:
+            if wrote_recently(user_id):
+                self.stats["read_your_writes"] += 1
+            else:
+                for i in self._order():
+                    served = False
+                    try:
+                        with self.pools[i].connection() as conn:
+                            if not self._check(i, conn):
+                                continue
+                            self.stats["replica"] += 1
+                            served = True
+                            yield conn
+                        return
+                    except psycopg2.OperationalError:
+                        if served:
+                            raise
+                        self._mark_down(i)
+                self.stats["fallbacks"] += 1
+        self.stats["primary"] += 1
+        with POOL.connection() as conn:
+            yield conn
+
+    def snapshot(self):
+        return {**self.stats, "replicas": [{"ok": s["ok"], "lag": s["lag"]} for s in self.state]}
+
+
+REPLICAS = ReadReplicas(
+    [dsn.strip() for dsn in os.environ.get("DATABASE_READ_URL", "").split(",") if dsn.strip()],
+    max_lag=READ_REPLICA_MAX_LAG,
+    check_every=READ_REPLICA_CHECK_INTERVAL,
+)
+
+
+def get_read_conn(user_id=None):
+    return REPLICAS.connection(user_id)
+
 
+def mark_write(user_id):
+    # Метка живёт в хранилище кэша: с CACHE_STORE=redis окно общее для всех экземпляров
+    if user_id and REPLICAS.pools:
+        try:
+            CACHE.store.set(f"ryw:{user_id}", "1", READ_YOUR_WRITES_WINDOW)
+        except Exception:
+            pass
 
-def is_admin(user_id):
+
+def wrote_recently(user_id):
     if not user_id:
         return False
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(f"SELECT is_admin FROM {SCHEMA}.users WHERE id=%s", (user_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row and row[0]
+    try:
+        return CACHE.store.get(f"ryw:{user_id}") is not None
+    except Exception:
+        return True
 
 
-def handler(event: dict, context) -> dict:
-    if event.get("httpMethod") == "OPTIONS":
-        return {"statusCode": 200, "headers": CORS, "body": ""}
+# psycopg2 импортируется при первом соединении с БД: OPTIONS, 404 и ответы из кэша обходятся без него
+psycopg2 = None
+_driver_lock = threading.Lock()
+
+
+def load_driver():
+    global psycopg2, PreparedConnection, TracingCursor
+    with _driver_lock:
+        if psycopg2 is not None:
+            return psycopg2
+        import psycopg2 as driver
+        import psycopg2.extensions as extensions
+
+        class PreparedConnection(extensions.connection):
+            """Соединение помнит, какие именованные запросы на нём уже подготовлены."""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+                if TRACE:
+                    self.cursor_factory = TracingCursor
+
+        class TracingCursor(extensions.cursor):
+            def execute(self, query, vars=None):
+                trace = current_trace()
+                if trace is None:
+                    return super().execute(query, vars)
+                start = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    trace.query(self, query, vars, time.perf_counter() - start)
+
+        psycopg2 = driver
+        return psycopg2
+
+
+def run(cur, name, args=()):
+    # PREPARE — один раз на соединение, дальше только EXECUTE с готовым планом
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+        conn.prepared.add(name)
+    if args:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+class MemoryStore:
+    """LRU-хранилище с TTL внутри процесса (по умолчанию)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.gens = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+                self.evictions += 1
 
-    method = event.get("httpMethod", "GET")
-    path = event.get("path", "/")
-    user_id = event.get("headers", {}).get("X-User-Id")
-    body = json.loads(event.get("body") or "{}")
+    def counters(self, keys):
+        return [self.gens.get(k, 0) for k in keys]
 
-    # GET /channels — список каналов
-    if method == "GET" and not any(x in path for x in ["/verify", "/create"]):
-        conn = get_conn()
+    def incr(self, key):
+        with self.lock:
+            self.gens[key] = self.gens.get(key, 0) + 1
+
+
+class RedisStore:
+    """Общее для всех функций хранилище (CACHE_STORE=redis, CACHE_REDIS_URL)."""
+
+    def __init__(self, url):
+        import redis
+        self.r = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.evictions = 0  # вытесняет сам Redis по maxmemory-policy
+
+    def get(self, key):
+        value = self.r.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.r.set(key, value, ex=max(1, int(ttl)))
+
+    def counters(self, keys):
+        return [int(v or 0) for v in self.r.mget(keys)]
+
+    def incr(self, key):
+        self.r.incr(key)
+
+
+class ResponseCache:
+    """Кэш GET-ответов с ETag. Ключ включает поколения тегов — инвалидация одним incr."""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+    def key(self, route, params, tags):
+        try:
+            gens = self.store.counters([f"gen:{t}" for t in tags])
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{route}?{query}#{'.'.join(map(str, gens))}"
+
+    def get(self, key):
+        value = None
+        if key:
+            try:
+                value = self.store.get(key)
+            except Exception:
+                self.stats["errors"] += 1
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value.split("\n", 1) if value is not None else None
+
+    def put(self, key, body):
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:20]
+        if key:
+            try:
+                self.store.set(key, f"{etag}\n{body}", self.ttl)
+            except Exception:
+                self.stats["errors"] += 1
+        return etag
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            try:
+                self.store.incr(f"gen:{tag}")
+            except Exception:
+                self.stats["errors"] += 1
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "evictions": self.store.evictions,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def make_store():
+    if os.environ.get("CACHE_STORE") == "redis":
+        return RedisStore(os.environ["CACHE_REDIS_URL"])
+    return MemoryStore(int(os.environ.get("CACHE_MAX_ENTRIES", "256")))
+
+
+CACHE = ResponseCache(make_store(), ttl=float(os.environ.get("CACHE_TTL", "30")))
+
+
+def cached_response(event, route, params, tags, build):
+    # В окне read-your-writes общий кэш пропускается: после инвалидации его мог заново заполнить
+    # чужой запрос с отстающей реплики, а build() у пишущего читает с primary
+    user_id = (event.get("headers") or {}).get("X-User-Id")
+    bypass = bool(REPLICAS.pools) and wrote_recently(user_id)
+    key = None if bypass else CACHE.key(route, params, tags)
+    hit = None if bypass else CACHE.get(key)
+    if hit:
+        etag, body = hit
+    else:
+        body = build()
+        etag = CACHE.put(key, body)
+    headers = {**CORS, "ETag": etag, "X-Cache": "BYPASS" if bypass else "HIT" if hit else "MISS"}
+    if (event.get("headers") or {}).get("If-None-Match") == etag:
+        CACHE.stats["not_modified"] += 1
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": body}
+
+
+class AdminCache:
+    """Кэш флага is_admin по user_id с TTL, отрицательные ответы тоже кэшируются (короче)."""
+
+    def __init__(self, ttl, negative_ttl, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _gen(self):
+        # Поколение "admin" в хранилище кэша: auth повышает его при выдаче прав
+        try:
+            return CACHE.store.counters(["gen:admin"])[0]
+        except Exception:
+            return None
+
+    def get(self, user_id):
+        if not user_id:
+            return False
+        entry = self.entries.get(str(user_id))
+        if entry and entry[1] > time.monotonic() and entry[2] == self._gen():
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        return None
+
+    def remember(self, user_id, flag):
+        flag = bool(flag)
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        ttl = self.ttl if flag else self.negative_ttl
+        self.entries[str(user_id)] = (flag, time.monotonic() + ttl, self._gen())
+        return flag
+
+    def load(self, user_id, conn):
         cur = conn.cursor()
-        cur.execute(
-            f"""SELECT c.id, c.name, c.description, c.icon, c.color,
-                       c.is_verified, c.verification_type, c.created_at,
-                       u.first_name, u.username,
-                       COUNT(DISTINCT a.id) as post_count
-                FROM {SCHEMA}.channels c
-                LEFT JOIN {SCHEMA}.users u ON c.created_by = u.id
-                LEFT JOIN {SCHEMA}.articles a ON a.channel_id = c.id AND a.status = 'published'
-                GROUP BY c.id, u.first_name, u.username
-                ORDER BY c.is_verified DESC, c.created_at ASC"""
-        )
-        rows = cur.fetchall()
+        run(cur, "is_admin", (user_id,))
+        row = cur.fetchone()
         cur.close()
-        conn.close()
-        channels = [
-            {
-                "id": r[0], "name": r[1], "description": r[2],
-                "icon": r[3], "color": r[4], "is_verified": r[5],
-                "verification_type": r[6],
-                "verification_label": VERIFICATION_TYPES.get(r[6]) if r[6] else None,
-                "created_at": r[7].isoformat() if r[7] else None,
-                "created_by": r[8] or r[9] or "ГТРК ОГФ",
-                "posts": r[10],
-                "subscribers": 0,
-            }
-            for r in rows
-        ]
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps(channels, ensure_ascii=False)}
-
-    # POST /channels/create — создать канал
-    if method == "POST" and path.endswith("/create"):
-        if not user_id:
-            return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "unauthorized"})}
-        name = body.get("name", "").strip()
-        description = body.get("description", "").strip()
-        icon = body.get("icon", "Newspaper")
-        color = body.get("color", "bg-blue-700")
-        if not name:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "name required"})}
-        conn = get_conn()
+        return self.remember(user_id, row and row[0])
+
+    def check(self, user_id, conn):
+        flag = self.get(user_id)
+        return self.load(user_id, conn) if flag is None else flag
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None}
+
+
+# Кэш флага is_admin: положительный ответ живёт ADMIN_CACHE_TTL секунд, отрицательный —
+# ADMIN_CACHE_NEGATIVE_TTL. С CACHE_STORE=redis выдача прав в auth сбрасывает кэш сразу (gen:admin);
+# без Redis новый админ получает доступ не позже чем через ADMIN_CACHE_NEGATIVE_TTL. Снятие прав
+# делается в БД и ничем не сигналится: оно вступает в силу не позже чем через ADMIN_CACHE_TTL.
+ADMINS = AdminCache(
+    ttl=float(os.environ.get("ADMIN_CACHE_TTL", "60")),
+    negative_ttl=float(os.environ.get("ADMIN_CACHE_NEGATIVE_TTL", "10")),
+)
+
+
+def is_admin(user_id, conn):
+    return ADMINS.check(user_id, conn)
+
+
+def channel_row_to_dict(r):
+    return {
+        "id": r[0], "name": r[1], "description": r[2],
+        "icon": r[3], "color": r[4], "is_verified": r[5],
+        "verification_type": r[6],
+        "verification_label": VERIFICATION_TYPES.get(r[6]) if r[6] else None,
+        "created_at": r[7].isoformat() if r[7] else None,
+        "created_by": r[8] or r[9] or "ГТРК ОГФ",
+        "posts": r[10],
+        "subscribers": 0,
+    }
+
+
+def encode_token(updated_at, row_id):
+    raw = json.dumps([updated_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        updated_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class Request:
+    """event вызова: метод, путь и параметры сразу, JSON-тело — при первом обращении к body."""
+
+    def __init__(self, event):
+        self.event = event
+        self.method = event.get("httpMethod", "GET")
+        self.path = event.get("path", "/")
+        self.user_id = (event.get("headers") or {}).get("X-User-Id")
+        self.params = event.get("queryStringParameters") or {}
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = json.loads(self.event.get("body") or "{}")
+        return self._body
+
+
+class Router:
+    """Таблица маршрутов: для каждого метода — скомпилированные при импорте шаблоны конца пути."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, method, pattern):
+        def register(fn):
+            self.routes.setdefault(method, []).append((re.compile(pattern + "$"), fn))
+            return fn
+        return register
+
+    def dispatch(self, req):
+        for pattern, fn in self.routes.get(req.method, ()):
+            match = pattern.search(req.path)
+            if match:
+                return fn(req, **match.groupdict())
+        return None
+
+
+ROUTES = Router()
+
+
+# GET /channels/cache-stats — статистика кэша ответов и кэша прав админа
+@ROUTES.route("GET", r"/cache-stats")
+def cache_stats(req):
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({**CACHE.snapshot(), "admin": ADMINS.snapshot(), "reads": REPLICAS.snapshot()})}
+
+
+# GET /channels/changes?since=<token>&limit= — каналы, созданные, (раз)верифицированные или со сменой
+# post_count после токена.
+# Без since отдаётся только стартовый токен: его берут до загрузки списка, дальше применяют дельты по id.
+@ROUTES.route("GET", r"/changes")
+def channel_changes(req):
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), CHANGES_MAX_LIMIT) if limit.isdigit() and int(limit) > 0 else CHANGES_DEFAULT_LIMIT
+    since = req.params.get("since")
+    after = decode_token(since) if since else None
+    if since and after is None:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid token"})}
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"""INSERT INTO {SCHEMA}.channels (name, description, icon, color, created_by)
-                VALUES (%s, %s, %s, %s, %s) RETURNING id""",
-            (name, description, icon, color, user_id)
-        )
+        if after is None:
+            run(cur, "changes_origin", (CHANGES_SETTLE,))
+            token, rows = encode_token(cur.fetchone()[0], 0), []
+        else:
+            run(cur, "channel_changes", (*after, CHANGES_SETTLE, limit + 1))
+            token, rows = since, cur.fetchall()
+        cur.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        token = encode_token(rows[-1][11], rows[-1][0])
+    items = [channel_row_to_dict(r) for r in rows]
+    return {"statusCode": 200, "headers": CORS, "body": dumps({"items": items, "next": token, "has_more": has_more}, ensure_ascii=False)}
+
+
+# GET /channels — список каналов
+@ROUTES.route("GET", r"")
+def list_channels(req):
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, "channel_list")
+            rows = cur.fetchall()
+            cur.close()
+        return dumps([channel_row_to_dict(r) for r in rows], ensure_ascii=False)
+
+    return cached_response(req.event, "channels", {}, ("channels", "articles"), build)
+
+
+# POST /channels/create — создать канал
+@ROUTES.route("POST", r"/create")
+def create_channel(req):
+    if not req.user_id:
+        return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "unauthorized"})}
+    name = req.body.get("name", "").strip()
+    description = req.body.get("description", "").strip()
+    icon = req.body.get("icon", "Newspaper")
+    color = req.body.get("color", "bg-blue-700")
+    if not name:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "name required"})}
+    with get_conn() as conn:
+        cur = conn.cursor()
+        run(cur, "channel_insert", (name, description, icon, color, req.user_id))
         new_id = cur.fetchone()[0]
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "name": name})}
+    CACHE.invalidate("channels")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "name": name})}
+
 
-    # PUT /channels/verify — верифицировать канал (только админ)
-    if method == "PUT" and path.endswith("/verify"):
-        if not is_admin(user_id):
+# PUT /channels/verify — верифицировать канал (только админ)
+@ROUTES.route("PUT", r"/verify")
+def verify_channel(req):
+    channel_id = req.body.get("channel_id")
+    vtype = req.body.get("verification_type")
+    is_verified = req.body.get("is_verified", True)
+    with get_conn() as conn:
+        if not is_admin(req.user_id, conn):
             return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
-        channel_id = body.get("channel_id")
-        vtype = body.get("verification_type")
-        is_verified = body.get("is_verified", True)
         if not channel_id:
             return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "channel_id required"})}
         if is_verified and vtype not in VERIFICATION_TYPES:
             return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid verification_type"})}
-        conn = get_conn()
         cur = conn.cursor()
         if is_verified:
-            cur.execute(
-                f"UPDATE {SCHEMA}.channels SET is_verified=TRUE, verification_type=%s WHERE id=%s",
-                (vtype, channel_id)
-            )
+            run(cur, "channel_verify", (vtype, channel_id))
         else:
-            cur.execute(
-                f"UPDATE {SCHEMA}.channels SET is_verified=FALSE, verification_type=NULL WHERE id=%s",
-                (channel_id,)
-            )
+            run(cur, "channel_unverify", (channel_id,))
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True})}
+    CACHE.invalidate("channels")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True})}
 
-    return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+
+@traced
+def handler(event: dict, context) -> dict:
+    if event.get("httpMethod") == "OPTIONS":
+        return {"statusCode": 200, "headers": CORS, "body": ""}
+    req = Request(event)
+    response = ROUTES.dispatch(req)
+    if response is None:
+        return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+    if req.method in ("POST", "PUT") and response.get("statusCode") == 200:
+        mark_write(req.user_id)
+    return response
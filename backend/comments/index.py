@@ -1,111 +1,1010 @@
 """
 Комментарии к статьям: получить список, добавить, одобрить/отклонить (только для авторизованных).
 """
+import base64
+import functools
+import hashlib
 import json
 import os
-import psycopg2
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 
 SCHEMA = "t_p60467862_wild_politics_portal"
 
 CORS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET, POST, PUT, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, X-User-Id",
+    "Access-Control-Allow-Headers": "Content-Type, X-User-Id, If-None-Match",
+    "Access-Control-Expose-Headers": "ETag, X-Cache, Server-Timing",
 }
 
+STREAM_BATCH = int(os.environ.get("STREAM_BATCH", "500"))
+MODERATION_BATCH_MAX = int(os.environ.get("MODERATION_BATCH_MAX", "1000"))
+COMMENTS_DEFAULT_LIMIT = 50
+COMMENTS_MAX_LIMIT = 200
+PREVIEW_DEFAULT_LIMIT = 3
+PREVIEW_MAX_LIMIT = 20
+PREVIEW_MAX_ARTICLES = 100
+# Модерация меняет comment_count, а с ним score трендов: после записи очередь article_trending_dirty
+# разбирается попутно, как в articles, не чаще раза в TRENDING_REFRESH_INTERVAL
+TRENDING_REFRESH_BATCH = int(os.environ.get("TRENDING_REFRESH_BATCH", "1000"))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get("TRENDING_REFRESH_INTERVAL", "60"))
+
+COMMENT_COLUMNS = f"""
+    SELECT cm.id, cm.article_id, cm.text, cm.status, cm.created_at,
+           u.first_name, u.username, u.id as author_id
+    FROM {SCHEMA}.comments cm
+    LEFT JOIN {SCHEMA}.users u ON cm.author_id = u.id
+"""
+COMMENT_ORDER = " ORDER BY cm.created_at ASC, cm.id ASC"
+
+QUERIES = {
+    "is_admin": f"SELECT is_admin FROM {SCHEMA}.users WHERE id=$1",
+    "comment_list": COMMENT_COLUMNS + "WHERE cm.status = $1" + COMMENT_ORDER + " LIMIT $2",
+    "comment_list_after": COMMENT_COLUMNS + """WHERE cm.status = $1
+        AND (cm.created_at, cm.id) > ($2::timestamp, $3::int)""" + COMMENT_ORDER + " LIMIT $4",
+    "comment_list_article": COMMENT_COLUMNS + "WHERE cm.status = $1 AND cm.article_id = $2" + COMMENT_ORDER + " LIMIT $3",
+    "comment_list_article_after": COMMENT_COLUMNS + """WHERE cm.status = $1 AND cm.article_id = $2
+        AND (cm.created_at, cm.id) > ($3::timestamp, $4::int)""" + COMMENT_ORDER + " LIMIT $5",
+    "comment_export": COMMENT_COLUMNS + "WHERE cm.status = $1" + COMMENT_ORDER,
+    "comment_export_article": COMMENT_COLUMNS + "WHERE cm.status = $1 AND cm.article_id = $2" + COMMENT_ORDER,
+    # Последние $2 одобренных комментариев к каждой статье из $1: по одному range scan индекса на статью
+    "comment_previews": f"""
+        SELECT p.id, p.article_id, p.text, p.status, p.created_at, u.first_name, u.username, u.id
+        FROM unnest($1::int[]) AS ids(article_id)
+        CROSS JOIN LATERAL (
+            SELECT cm.id, cm.article_id, cm.text, cm.status, cm.created_at, cm.author_id
+            FROM {SCHEMA}.comments cm
+            WHERE cm.article_id = ids.article_id AND cm.status = 'approved'
+            ORDER BY cm.created_at DESC, cm.id DESC
+            LIMIT $2
+        ) p
+        LEFT JOIN {SCHEMA}.users u ON p.author_id = u.id
+        ORDER BY p.article_id, p.created_at DESC, p.id DESC""",
+    "comment_insert": f"""INSERT INTO {SCHEMA}.comments (article_id, author_id, text, status)
+        VALUES ($1, $2, $3, 'pending') RETURNING id""",
+    "comment_lock": f"""SELECT cm.status, cm.article_id, (SELECT is_admin FROM {SCHEMA}.users WHERE id=$2)
+        FROM {SCHEMA}.comments cm WHERE cm.id=$1 FOR UPDATE OF cm""",
+    "comment_moderate": f"UPDATE {SCHEMA}.comments SET status=$1 WHERE id=$2",
+    "comment_lock_many": f"SELECT id, status, article_id FROM {SCHEMA}.comments WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE",
+    "comment_moderate_many": f"""UPDATE {SCHEMA}.comments cm SET status = t.status
+        FROM unnest($1::int[], $2::text[]) AS t(id, status) WHERE cm.id = t.id""",
+    "article_comment_count_add_many": f"""UPDATE {SCHEMA}.articles a
+        SET comment_count = a.comment_count + d.delta, updated_at = clock_timestamp()
+        FROM unnest($1::int[], $2::int[]) AS d(id, delta) WHERE a.id = d.id""",
+    "article_comment_count_add": f"UPDATE {SCHEMA}.articles SET comment_count = comment_count + $1, updated_at = clock_timestamp() WHERE id=$2",
+    "trending_refresh": f"SELECT * FROM {SCHEMA}.article_trending_refresh($1)",
+}
+
+
+# Трассировка запросов: TRACE_REQUESTS=1 включает тайминги фаз, счётчики запросов и строк,
+# строку лога и заголовок Server-Timing; запросы дольше TRACE_EXPLAIN_MS дополнительно
+# прогоняются через EXPLAIN внутри SAVEPOINT с откатом: чтения — с ANALYZE и BUFFERS,
+# записи — только план, без повторного выполнения.
+# Выключенная трассировка стоит один getattr на threading.local.
+TRACE = os.environ.get("TRACE_REQUESTS", "") == "1"
+TRACE_EXPLAIN_MS = float(os.environ.get("TRACE_EXPLAIN_MS", "0"))
+_trace = threading.local()
+# EXPLAIN ANALYZE выполняет запрос: откат SAVEPOINT убирает строки, но не шаги последовательностей
+# и не время удержания блокировок, поэтому всё, что может писать, объясняется без ANALYZE
+WRITE_SQL = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY)\b|\bnextval\s*\(", re.I)
+
+
+def current_trace():
+    return getattr(_trace, "current", None)
+
+
+class RequestTrace:
+    """Тайминги фаз одного вызова handler: conn, db, json."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.rows = 0
+        self.slow = []
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def query(self, cur, sql, args, seconds):
+        self.add("db", seconds)
+        self.queries += 1
+        if cur.rowcount > 0:
+            self.rows += cur.rowcount
+        if TRACE_EXPLAIN_MS and seconds * 1000 >= TRACE_EXPLAIN_MS and cur.name is None \
+                and not sql.lstrip().upper().startswith(("PREPARE", "SAVEPOINT", "ROLLBACK", "EXPLAIN")):
+            self.slow.append({
+                "query": sql.strip()[:500],
+                "ms": round(seconds * 1000, 3),
+                "plan": explain(cur.connection, cur.mogrify(sql, args).decode()),
+            })
+
+    def finish(self, response, status):
+        total = (time.perf_counter() - self.started) * 1000
+        timing = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        timing.append(f"total;dur={total:.2f}")
+        if isinstance(response, dict):
+            response["headers"] = {**(response.get("headers") or {}), "Server-Timing": ", ".join(timing)}
+        print(json.dumps({
+            "trace": self.route,
+            "status": status,
+            "total_ms": round(total, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+            "rows": self.rows,
+            "slow": self.slow,
+        }, ensure_ascii=False, default=str))
+
+
+def is_read(sql):
+    # EXECUTE name (...) — смотрим на текст подготовленного запроса из QUERIES
+    m = re.match(r"\s*EXECUTE\s+(\w+)", sql, re.I)
+    text = QUERIES.get(m.group(1), sql) if m else sql
+    return text.lstrip().upper().startswith(("SELECT", "WITH")) and not WRITE_SQL.search(text)
+
+
+def explain(conn, sql):
+    # Отдельный обычный курсор: результат исходного запроса остаётся непрочитанным
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if is_read(sql) else "FORMAT JSON"
+    cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    try:
+        cur.execute("SAVEPOINT trace_explain")
+        try:
+            cur.execute(f"EXPLAIN ({options}) " + sql)
+            return cur.fetchone()[0]
+        finally:
+            cur.execute("ROLLBACK TO SAVEPOINT trace_explain")
+    except psycopg2.Error as e:
+        return {"error": str(e).strip()}
+    finally:
+        cur.close()
+
+
+def dumps(obj, **kwargs):
+    trace = current_trace()
+    if trace is None:
+        return json.dumps(obj, **kwargs)
+    start = time.perf_counter()
+    try:
+        return json.dumps(obj, **kwargs)
+    finally:
+        trace.add("json", time.perf_counter() - start)
+
+
+def traced(fn):
+    if not TRACE:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        trace = RequestTrace(f"{event.get('httpMethod', 'GET')} {event.get('path', '/')}")
+        _trace.current = trace
+        response, status = None, 500
+        try:
+            response = fn(event, context)
+            status = response.get("statusCode")
+            return response
+        finally:
+            _trace.current = None
+            trace.finish(response, status)
+
+    return wrapper
+
+
+class ConnPool:
+    """Пул соединений с БД, переживает тёплые вызовы функции."""
+
+    def __init__(self, size, check_after, dsn=None):
+        self.size = size
+        self.check_after = check_after
+        self.dsn = dsn
+        self.idle = []
+        self.opened = 0
+        self.cond = threading.Condition()
+        self.stats = {"checkouts": 0, "waits": 0, "reconnects": 0}
+
+    def _connect(self):
+        load_driver()
+        return psycopg2.connect(self.dsn or os.environ["DATABASE_URL"], connection_factory=PreparedConnection)
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        with self.cond:
+            self.stats["checkouts"] += 1
+            while not self.idle and self.opened >= self.size:
+                self.stats["waits"] += 1
+                self.cond.wait()
+            if self.idle:
+                conn, idle_since = self.idle.pop()
+            else:
+                self.opened += 1
+                conn, idle_since = None, None
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - idle_since > self.check_after and not self._healthy(conn):
+                self._discard(conn)
+                self.stats["reconnects"] += 1
+                conn = self._connect()
+        except Exception:
+            with self.cond:
+                self.opened -= 1
+                self.cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self.cond:
+            if broken or conn.closed:
+                self._discard(conn)
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self):
+        trace = current_trace()
+        start = time.perf_counter() if trace else 0
+        conn = self.acquire()
+        if trace:
+            trace.add("conn", time.perf_counter() - start)
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(conn, broken=True)
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+
+POOL = ConnPool(
+    size=int(os.environ.get("DB_POOL_SIZE", "2")),
+    check_after=float(os.environ.get("DB_POOL_CHECK_AFTER", "30")),
+)
+
 
 def get_conn():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    return POOL.connection()
+
+
+# Реплики для чтения: DATABASE_READ_URL — один DSN или несколько через запятую.
+# GET-маршруты читают с реплик по кругу; недоступная или отстающая больше READ_REPLICA_MAX_LAG
+# секунд пропускается до следующей проверки, а без здоровых реплик чтение идёт с primary.
+# После своей записи (POST/PUT) пользователь READ_YOUR_WRITES_WINDOW секунд читает с primary
+# и мимо общего кэша ответов.
+READ_REPLICA_MAX_LAG = float(os.environ.get("READ_REPLICA_MAX_LAG", "5"))
+READ_REPLICA_CHECK_INTERVAL = float(os.environ.get("READ_REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_WINDOW = float(os.environ.get("READ_YOUR_WRITES_WINDOW", "10"))
+REPLICA_LAG_QUERY = """SELECT CASE WHEN pg_is_in_recovery()
+    THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"""
+
+
+class ReadReplicas:
+    """Пулы реплик: выбор по кругу, отставание проверяется не чаще раза в check_every секунд."""
+
+    def __init__(self, dsns, max_lag, check_every):
+        self.pools = [ConnPool(size=POOL.size, check_after=POOL.check_after, dsn=dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.state = [{"ok": True, "checked": float("-inf"), "lag": None} for _ in dsns]
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.stats = {"replica": 0, "primary": 0, "read_your_writes": 0, "fallbacks": 0}
 
+    def _order(self):
+        with self.lock:
+            self.turn = (self.turn + 1) % len(self.pools)
+            start = self.turn
+        now = time.monotonic()
+        order = []
+        for k in range(len(self.pools)):
+            i = (start + k) % len(self.pools)
+            if self.state[i]["ok"] or now - self.state[i]["checked"] >= self.check_every:
+                order.append(i)
+        return order
 
-def is_admin(user_id):
+    def _check(self, i, conn):
+        state = self.state[i]
+        if time.monotonic() - state["checked"] < self.check_every:
+            return state["ok"]
+        try:
+            cur = conn.cursor()
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = cur.fetchone()[0]
+            cur.close()
+        except psycopg2.Error:
+            lag = None
+        state["lag"] = float(lag) if lag is not None else None
+        state["ok"] = lag is not None and lag <= self.max_lag
+        state["checked"] = time.monotonic()
+        return state["ok"]
+
+    def _mark_down(self, i):
+        self.state[i].update(ok=False, lag=None, checked=time.monotonic())
+
+    @contextmanager
+    def connection(self, user_id=None):
+        if self.pools:
+            if wrote_recently(user_id):
+                self.stats["read_your_writes"] += 1
+            else:
+                for i in self._order():
+                    served = False
+                    try:
+                        with self.pools[i].connection() as conn:
+                            if not self._check(i, conn):
+                                continue
+                            self.stats["replica"] += 1
+                            served = True
+                            yield conn
+                        return
+                    except psycopg2.OperationalError:
+                        if served:
+                            raise
+                        self._mark_down(i)
+                self.stats["fallbacks"] += 1
+        self.stats["primary"] += 1
+        with POOL.connection() as conn:
+            yield conn
+
+    def snapshot(self):
+        return {**self.stats, "replicas": [{"ok": s["ok"], "lag": s["lag"]} for s in self.state]}
+
+
+REPLICAS = ReadReplicas(
+    [dsn.strip() for dsn in os.environ.get("DATABASE_READ_URL", "").split(",") if dsn.strip()],
+    max_lag=READ_REPLICA_MAX_LAG,
+    check_every=READ_REPLICA_CHECK_INTERVAL,
+)
+
+
+def get_read_conn(user_id=None):
+    return REPLICAS.connection(user_id)
+
+
+def mark_write(user_id):
+    # Метка живёт в хранилище кэша: с CACHE_STORE=redis окно общее для всех экземпляров
+    if user_id and REPLICAS.pools:
+        try:
+            CACHE.store.set(f"ryw:{user_id}", "1", READ_YOUR_WRITES_WINDOW)
+        except Exception:
+            pass
+
+
+def wrote_recently(user_id):
     if not user_id:
         return False
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(f"SELECT is_admin FROM {SCHEMA}.users WHERE id=%s", (user_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row and row[0]
+    try:
+        return CACHE.store.get(f"ryw:{user_id}") is not None
+    except Exception:
+        return True
 
 
-def handler(event: dict, context) -> dict:
-    if event.get("httpMethod") == "OPTIONS":
-        return {"statusCode": 200, "headers": CORS, "body": ""}
+# psycopg2 импортируется при первом соединении с БД: OPTIONS, 404 и ответы из кэша обходятся без него
+psycopg2 = None
+_driver_lock = threading.Lock()
 
-    method = event.get("httpMethod", "GET")
-    path = event.get("path", "/")
-    user_id = event.get("headers", {}).get("X-User-Id")
-    params = event.get("queryStringParameters") or {}
-    body = json.loads(event.get("body") or "{}")
-
-    # GET /comments?article_id=X — комментарии к статье
-    if method == "GET":
-        article_id = params.get("article_id")
-        status_filter = params.get("status", "approved")
-        where = f"WHERE cm.status = '{status_filter}'"
-        if article_id:
-            where += f" AND cm.article_id = {int(article_id)}"
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            f"""SELECT cm.id, cm.article_id, cm.text, cm.status, cm.created_at,
-                       u.first_name, u.username, u.id as author_id
-                FROM {SCHEMA}.comments cm
-                LEFT JOIN {SCHEMA}.users u ON cm.author_id = u.id
-                {where}
-                ORDER BY cm.created_at ASC""",
-        )
-        rows = cur.fetchall()
+
+def load_driver():
+    global psycopg2, PreparedConnection, TracingCursor
+    with _driver_lock:
+        if psycopg2 is not None:
+            return psycopg2
+        import psycopg2 as driver
+        import psycopg2.extensions as extensions
+
+        class PreparedConnection(extensions.connection):
+            """Соединение помнит, какие именованные запросы на нём уже подготовлены."""
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+                if TRACE:
+                    self.cursor_factory = TracingCursor
+
+        class TracingCursor(extensions.cursor):
+            def execute(self, query, vars=None):
+                trace = current_trace()
+                if trace is None:
+                    return super().execute(query, vars)
+                start = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    trace.query(self, query, vars, time.perf_counter() - start)
+
+        psycopg2 = driver
+        return psycopg2
+
+
+def run(cur, name, args=()):
+    # PREPARE — один раз на соединение, дальше только EXECUTE с готовым планом
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {QUERIES[name]}")
+        conn.prepared.add(name)
+    if args:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def stream_query(conn, name, args=()):
+    # Серверный курсор: строки приходят пачками по STREAM_BATCH, а не всем результатом сразу
+    cur = conn.cursor(name=f"stream_{name}")
+    cur.itersize = STREAM_BATCH
+    # $N -> %(pN)s для psycopg2; литеральный % (LIKE 'a%', форматирование) экранируется заранее
+    sql = re.sub(r"\$(\d+)", r"%(p\1)s", QUERIES[name].replace("%", "%%"))
+    cur.execute(sql, {f"p{i}": v for i, v in enumerate(args, 1)})
+    try:
+        yield from cur
+    finally:
         cur.close()
-        conn.close()
-        comments = [
-            {
-                "id": r[0], "article_id": r[1], "text": r[2], "status": r[3],
-                "created_at": r[4].isoformat() if r[4] else None,
-                "author_name": r[5] or r[6] or "Гражданин ОГФ",
-                "author_id": r[7],
-            }
-            for r in rows
-        ]
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps(comments, ensure_ascii=False)}
-
-    # POST / — добавить комментарий (только авторизованные)
-    if method == "POST":
+
+
+def encode_rows(rows, to_dict, ndjson=False):
+    # Каждая строка сразу кодируется во фрагмент JSON, тело склеивается одним join в конце.
+    # Пик памяти — фрагменты плюс готовое тело, около двух тел: растёт с размером выгрузки
+    parts = []
+    if ndjson:
+        for r in rows:
+            parts.append(dumps(to_dict(r), ensure_ascii=False))
+            parts.append("\n")
+        return "".join(parts)
+    parts.append("[")
+    for r in rows:
+        parts.append(dumps(to_dict(r), ensure_ascii=False))
+        parts.append(", ")
+    if len(parts) > 1:
+        parts[-1] = "]"
+    else:
+        parts.append("]")
+    return "".join(parts)
+
+
+class MemoryStore:
+    """LRU-хранилище с TTL внутри процесса (по умолчанию)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.gens = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ttl)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def counters(self, keys):
+        return [self.gens.get(k, 0) for k in keys]
+
+    def incr(self, key):
+        with self.lock:
+            self.gens[key] = self.gens.get(key, 0) + 1
+
+
+class RedisStore:
+    """Общее для всех функций хранилище (CACHE_STORE=redis, CACHE_REDIS_URL)."""
+
+    def __init__(self, url):
+        import redis
+        self.r = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.evictions = 0  # вытесняет сам Redis по maxmemory-policy
+
+    def get(self, key):
+        value = self.r.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.r.set(key, value, ex=max(1, int(ttl)))
+
+    def counters(self, keys):
+        return [int(v or 0) for v in self.r.mget(keys)]
+
+    def incr(self, key):
+        self.r.incr(key)
+
+
+class ResponseCache:
+    """Кэш GET-ответов с ETag. Ключ включает поколения тегов — инвалидация одним incr."""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "errors": 0}
+
+    def key(self, route, params, tags):
+        try:
+            gens = self.store.counters([f"gen:{t}" for t in tags])
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{route}?{query}#{'.'.join(map(str, gens))}"
+
+    def get(self, key):
+        value = None
+        if key:
+            try:
+                value = self.store.get(key)
+            except Exception:
+                self.stats["errors"] += 1
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value.split("\n", 1) if value is not None else None
+
+    def put(self, key, body):
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:20]
+        if key:
+            try:
+                self.store.set(key, f"{etag}\n{body}", self.ttl)
+            except Exception:
+                self.stats["errors"] += 1
+        return etag
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            try:
+                self.store.incr(f"gen:{tag}")
+            except Exception:
+                self.stats["errors"] += 1
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "evictions": self.store.evictions,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def make_store():
+    if os.environ.get("CACHE_STORE") == "redis":
+        return RedisStore(os.environ["CACHE_REDIS_URL"])
+    return MemoryStore(int(os.environ.get("CACHE_MAX_ENTRIES", "256")))
+
+
+CACHE = ResponseCache(make_store(), ttl=float(os.environ.get("CACHE_TTL", "30")))
+
+
+def cached_response(event, route, params, tags, build):
+    # В окне read-your-writes общий кэш пропускается: после инвалидации его мог заново заполнить
+    # чужой запрос с отстающей реплики, а build() у пишущего читает с primary
+    user_id = (event.get("headers") or {}).get("X-User-Id")
+    bypass = bool(REPLICAS.pools) and wrote_recently(user_id)
+    key = None if bypass else CACHE.key(route, params, tags)
+    hit = None if bypass else CACHE.get(key)
+    if hit:
+        etag, body = hit
+    else:
+        body = build()
+        etag = CACHE.put(key, body)
+    headers = {**CORS, "ETag": etag, "X-Cache": "BYPASS" if bypass else "HIT" if hit else "MISS"}
+    if (event.get("headers") or {}).get("If-None-Match") == etag:
+        CACHE.stats["not_modified"] += 1
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": 200, "headers": headers, "body": body}
+
+
+INT4_MAX = 2 ** 31 - 1
+
+
+def parse_id(value):
+    # id из JSON или пути: целое или строка ASCII-цифр в диапазоне SERIAL (int4); bool — не id
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if type(value) is int and 0 < value <= INT4_MAX:
+        return value
+    return None
+
+
+def parse_flag(value):
+    # Только true/false или 0/1: строка "false" не должна превращаться в True
+    if isinstance(value, bool):
+        return value
+    if type(value) is int and value in (0, 1):
+        return bool(value)
+    return None
+
+
+def encode_cursor(created_at, comment_id):
+    raw = json.dumps([created_at.isoformat(), comment_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, comment_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (ValueError, TypeError):
+        return None
+
+
+_last_trending_refresh = 0.0
+
+
+def refresh_trending_after_write():
+    # Одна порция очереди трендов (SQL-функция из V0011, та же, что в articles)
+    global _last_trending_refresh
+    if time.monotonic() - _last_trending_refresh <= TRENDING_REFRESH_INTERVAL:
+        return
+    _last_trending_refresh = time.monotonic()
+    try:
+        with get_conn() as conn:
+            cur = conn.cursor()
+            run(cur, "trending_refresh", (TRENDING_REFRESH_BATCH,))
+            touched, scored, dropped = cur.fetchone()
+            conn.commit()
+            cur.close()
+    except psycopg2.Error:
+        return
+    if scored or dropped:
+        CACHE.invalidate("trending")
+
+
+def comment_row_to_dict(r):
+    return {
+        "id": r[0], "article_id": r[1], "text": r[2], "status": r[3],
+        "created_at": r[4].isoformat() if r[4] else None,
+        "author_name": r[5] or r[6] or "Гражданин ОГФ",
+        "author_id": r[7],
+    }
+
+
+class AdminCache:
+    """Кэш флага is_admin по user_id с TTL, отрицательные ответы тоже кэшируются (короче)."""
+
+    def __init__(self, ttl, negative_ttl, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _gen(self):
+        # Поколение "admin" в хранилище кэша: auth повышает его при выдаче прав
+        try:
+            return CACHE.store.counters(["gen:admin"])[0]
+        except Exception:
+            return None
+
+    def get(self, user_id):
         if not user_id:
-            return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "Войдите через Telegram для комментирования"})}
-        article_id = body.get("article_id")
-        text = body.get("text", "").strip()
-        if not article_id or not text:
-            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
-        conn = get_conn()
+            return False
+        entry = self.entries.get(str(user_id))
+        if entry and entry[1] > time.monotonic() and entry[2] == self._gen():
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        return None
+
+    def remember(self, user_id, flag):
+        flag = bool(flag)
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        ttl = self.ttl if flag else self.negative_ttl
+        self.entries[str(user_id)] = (flag, time.monotonic() + ttl, self._gen())
+        return flag
+
+    def load(self, user_id, conn):
+        cur = conn.cursor()
+        run(cur, "is_admin", (user_id,))
+        row = cur.fetchone()
+        cur.close()
+        return self.remember(user_id, row and row[0])
+
+    def check(self, user_id, conn):
+        flag = self.get(user_id)
+        return self.load(user_id, conn) if flag is None else flag
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None}
+
+
+# Кэш флага is_admin: положительный ответ живёт ADMIN_CACHE_TTL секунд, отрицательный —
+# ADMIN_CACHE_NEGATIVE_TTL. С CACHE_STORE=redis выдача прав в auth сбрасывает кэш сразу (gen:admin);
+# без Redis новый админ получает доступ не позже чем через ADMIN_CACHE_NEGATIVE_TTL. Снятие прав
+# делается в БД и ничем не сигналится: оно вступает в силу не позже чем через ADMIN_CACHE_TTL.
+ADMINS = AdminCache(
+    ttl=float(os.environ.get("ADMIN_CACHE_TTL", "60")),
+    negative_ttl=float(os.environ.get("ADMIN_CACHE_NEGATIVE_TTL", "10")),
+)
+
+
+def is_admin(user_id, conn):
+    return ADMINS.check(user_id, conn)
+
+
+class Request:
+    """event вызова: метод, путь и параметры сразу, JSON-тело — при первом обращении к body."""
+
+    def __init__(self, event):
+        self.event = event
+        self.method = event.get("httpMethod", "GET")
+        self.path = event.get("path", "/")
+        self.user_id = (event.get("headers") or {}).get("X-User-Id")
+        self.params = event.get("queryStringParameters") or {}
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = json.loads(self.event.get("body") or "{}")
+        return self._body
+
+
+class Router:
+    """Таблица маршрутов: для каждого метода — скомпилированные при импорте шаблоны конца пути."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def route(self, method, pattern):
+        def register(fn):
+            self.routes.setdefault(method, []).append((re.compile(pattern + "$"), fn))
+            return fn
+        return register
+
+    def dispatch(self, req):
+        for pattern, fn in self.routes.get(req.method, ()):
+            match = pattern.search(req.path)
+            if match:
+                return fn(req, **match.groupdict())
+        return None
+
+
+ROUTES = Router()
+
+
+# GET /comments/cache-stats — статистика кэша ответов и кэша прав админа
+@ROUTES.route("GET", r"/cache-stats")
+def cache_stats(req):
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({**CACHE.snapshot(), "admin": ADMINS.snapshot(), "reads": REPLICAS.snapshot()})}
+
+
+# GET /comments/previews?article_ids=1,2,3&limit=3 — последние комментарии к нескольким статьям разом
+@ROUTES.route("GET", r"/previews")
+def previews(req):
+    raw_ids = [x.strip() for x in (req.params.get("article_ids") or "").split(",") if x.strip()]
+    if not raw_ids:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "article_ids required"})}
+    article_ids = [parse_id(x) for x in raw_ids]
+    if None in article_ids:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid article_ids"})}
+    article_ids = sorted(set(article_ids))
+    if len(article_ids) > PREVIEW_MAX_ARTICLES:
+        return {"statusCode": 413, "headers": CORS, "body": json.dumps({"error": "too many articles", "max": PREVIEW_MAX_ARTICLES})}
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), PREVIEW_MAX_LIMIT) if limit.isascii() and limit.isdigit() and int(limit) > 0 else PREVIEW_DEFAULT_LIMIT
+
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, "comment_previews", (article_ids, limit))
+            rows = cur.fetchall()
+            cur.close()
+        previews = {str(i): [] for i in article_ids}
+        for r in rows:
+            previews[str(r[1])].append(comment_row_to_dict(r))
+        return dumps(previews, ensure_ascii=False)
+
+    key_params = {"article_ids": ",".join(map(str, article_ids)), "limit": limit}
+    return cached_response(req.event, "previews", key_params, ("comments",), build)
+
+
+# GET /comments?article_id=X&cursor=&limit= — комментарии к статье страницами
+# (format=ndjson — выгрузка всех подходящих комментариев потоком)
+@ROUTES.route("GET", r"")
+def list_comments(req):
+    article_id = req.params.get("article_id")
+    if article_id and parse_id(article_id) is None:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid article_id"})}
+    status_filter = req.params.get("status", "approved")
+    ndjson = req.params.get("format") == "ndjson"
+
+    if ndjson:
+        # Полная выгрузка идёт потоком мимо кэша ответов, как /articles/export: тело не хэшируется
+        # и не оседает в LRU
+        query, args = "comment_export", (status_filter,)
+        if article_id:
+            query, args = "comment_export_article", (status_filter, int(article_id))
+        with get_read_conn(req.user_id) as conn:
+            body_out = encode_rows(stream_query(conn, query, args), comment_row_to_dict, ndjson=True)
+        return {"statusCode": 200, "headers": {**CORS, "Content-Type": "application/x-ndjson"}, "body": body_out}
+
+    limit = req.params.get("limit", "")
+    limit = min(int(limit), COMMENTS_MAX_LIMIT) if limit.isascii() and limit.isdigit() and int(limit) > 0 else COMMENTS_DEFAULT_LIMIT
+    query, args = "comment_list", [status_filter]
+    if article_id:
+        query, args = "comment_list_article", [status_filter, int(article_id)]
+    if req.params.get("cursor"):
+        after = decode_cursor(req.params["cursor"])
+        if after is None:
+            return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid cursor"})}
+        query += "_after"
+        args.extend(after)
+    args.append(limit + 1)
+
+    def build():
+        with get_read_conn(req.user_id) as conn:
+            cur = conn.cursor()
+            run(cur, query, args)
+            rows = cur.fetchall()
+            cur.close()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+        items = [comment_row_to_dict(r) for r in rows]
+        return dumps({"items": items, "next_cursor": next_cursor}, ensure_ascii=False)
+
+    key_params = {"article_id": article_id or "", "status": status_filter, "limit": limit, "cursor": req.params.get("cursor", "")}
+    return cached_response(req.event, "comments", key_params, ("comments",), build)
+
+
+# POST / — добавить комментарий (только авторизованные)
+@ROUTES.route("POST", r"")
+def add_comment(req):
+    if not req.user_id:
+        return {"statusCode": 401, "headers": CORS, "body": json.dumps({"error": "Войдите через Telegram для комментирования"})}
+    article_id = req.body.get("article_id")
+    text = req.body.get("text", "").strip()
+    if not article_id or not text:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "missing fields"})}
+    with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"INSERT INTO {SCHEMA}.comments (article_id, author_id, text, status) VALUES (%s, %s, %s, 'pending') RETURNING id",
-            (article_id, user_id, text)
-        )
+        run(cur, "comment_insert", (article_id, req.user_id, text))
         new_id = cur.fetchone()[0]
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "status": "pending"})}
+    CACHE.invalidate("comments")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"id": new_id, "status": "pending"})}
+
+
+# PUT /moderate/batch — массовая модерация: {"items": [{id, action}]}
+@ROUTES.route("PUT", r"/moderate/batch")
+def moderate_batch(req):
+    items = req.body.get("items")
+    if not isinstance(items, list) or not items:
+        return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "items required"})}
+    if len(items) > MODERATION_BATCH_MAX:
+        return {"statusCode": 413, "headers": CORS, "body": json.dumps({"error": "too many items", "max": MODERATION_BATCH_MAX})}
+    # Результаты — в порядке items; wanted: id -> (статус, позиция в results)
+    results, wanted = [], {}
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        item_id, action = parse_id(item.get("id")), item.get("action")
+        error = "invalid id" if item_id is None else "invalid action" if action not in ("approve", "reject") else None
+        if error:
+            results.append({"id": item.get("id"), "result": "invalid", "error": error})
+            continue
+        # Повтор id в пачке — побеждает последний, прежние позиции помечаются duplicate
+        if item_id in wanted:
+            results[wanted[item_id][1]] = {"id": item_id, "result": "duplicate"}
+        wanted[item_id] = ("approved" if action == "approve" else "rejected", len(results))
+        results.append(None)
+    with get_conn() as conn:
+        if not is_admin(req.user_id, conn):
+            return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
+        cur = conn.cursor()
+        old = {}
+        if wanted:
+            run(cur, "comment_lock_many", (sorted(wanted),))
+            old = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+        found = sorted(set(wanted) & set(old))
+        if found:
+            run(cur, "comment_moderate_many", (found, [wanted[i][0] for i in found]))
+            deltas = {}
+            for i in found:
+                article_id = old[i][1]
+                if article_id:
+                    deltas[article_id] = deltas.get(article_id, 0) + (wanted[i][0] == "approved") - (old[i][0] == "approved")
+            deltas = sorted((k, v) for k, v in deltas.items() if v)
+            if deltas:
+                run(cur, "article_comment_count_add_many", ([d[0] for d in deltas], [d[1] for d in deltas]))
+        conn.commit()
+        cur.close()
+    for i, (status, pos) in wanted.items():
+        results[pos] = {"id": i, "result": status if i in old else "not_found"}
+    if found:
+        CACHE.invalidate("comments")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True, "results": results})}
 
-    # PUT /moderate — одобрить/отклонить комментарий (только админ)
-    if method == "PUT" and path.endswith("/moderate"):
-        if not is_admin(user_id):
+
+# PUT /moderate — одобрить/отклонить комментарий (только админ)
+@ROUTES.route("PUT", r"/moderate")
+def moderate_comment(req):
+    comment_id = parse_id(req.body.get("comment_id"))
+    action = req.body.get("action")
+    status = "approved" if action == "approve" else "rejected"
+    valid = comment_id is not None and action in ("approve", "reject")
+    with get_conn() as conn:
+        admin = ADMINS.get(req.user_id)
+        if admin is None and not valid:
+            admin = ADMINS.load(req.user_id, conn)
+        if admin is False:
             return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
-        comment_id = body.get("comment_id")
-        action = body.get("action")
-        if not comment_id or action not in ("approve", "reject"):
+        if not valid:
             return {"statusCode": 400, "headers": CORS, "body": json.dumps({"error": "invalid"})}
-        status = "approved" if action == "approve" else "rejected"
-        conn = get_conn()
         cur = conn.cursor()
-        cur.execute(f"UPDATE {SCHEMA}.comments SET status=%s WHERE id=%s", (status, comment_id))
+        # При промахе кэша флаг админа приходит тем же запросом, что и блокировка строки
+        run(cur, "comment_lock", (comment_id, req.user_id))
+        old = cur.fetchone()
+        if admin is None:
+            admin = ADMINS.remember(req.user_id, old[2]) if old else ADMINS.load(req.user_id, conn)
+            if not admin:
+                cur.close()
+                return {"statusCode": 403, "headers": CORS, "body": json.dumps({"error": "forbidden"})}
+        run(cur, "comment_moderate", (status, comment_id))
+        # Счётчик комментариев статьи меняется только при входе/выходе из 'approved'
+        if old and old[1]:
+            delta = (status == "approved") - (old[0] == "approved")
+            if delta:
+                run(cur, "article_comment_count_add", (delta, old[1]))
         conn.commit()
         cur.close()
-        conn.close()
-        return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True})}
+    CACHE.invalidate("comments")
+    return {"statusCode": 200, "headers": CORS, "body": json.dumps({"ok": True})}
+
 
-    return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+@traced
+def handler(event: dict, context) -> dict:
+    if event.get("httpMethod") == "OPTIONS":
+        return {"statusCode": 200, "headers": CORS, "body": ""}
+    req = Request(event)
+    response = ROUTES.dispatch(req)
+    if response is None:
+        return {"statusCode": 404, "headers": CORS, "body": json.dumps({"error": "not found"})}
+    if req.method in ("POST", "PUT") and response.get("statusCode") == 200:
+        mark_write(req.user_id)
+        refresh_trending_after_write()
+    return response
@@ -0,0 +1,139 @@
+"""
+Проверка кэша прав админа в модерации, без БД.
+
+    python bench/admin_cache.py
+
+Пул соединений подменяется заглушкой, которая записывает выполненные запросы. Для
+модерации статьи и комментария проверяется, что проверка прав не стоит ни лишнего
+соединения, ни отдельного запроса is_admin — ни при промахе кэша (флаг приходит в запросе
+блокировки строки), ни при попадании. Для верификации канала при попадании запроса is_admin
+нет. Отдельно замеряется, через сколько без Redis становится видна выдача прав: не позже
+ADMIN_CACHE_NEGATIVE_TTL (здесь уменьшен до 0.3 с). Завершается с кодом 1 при нарушении.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from views_hot_article import load_handler
+
+USER = "7"
+
+EVENTS = {
+    "articles": {"httpMethod": "PUT", "path": "/articles/5/moderate", "body": json.dumps({"action": "approve"})},
+    "comments": {"httpMethod": "PUT", "path": "/moderate", "body": json.dumps({"comment_id": 5, "action": "approve"})},
+    "channels": {"httpMethod": "PUT", "path": "/verify",
+                 "body": json.dumps({"channel_id": 3, "verification_type": "government"})},
+}
+
+
+class FakeDB:
+    def __init__(self):
+        self.admin = True
+        self.connections = 0
+        self.executed = []
+
+
+class FakeCursor:
+    def __init__(self, conn, db):
+        self.connection = conn
+        self.db = db
+        self.row = None
+        self.rowcount = 1
+
+    def execute(self, sql, args=None):
+        if not sql.startswith("EXECUTE"):
+            return
+        name = sql.split()[1]
+        self.db.executed.append(name)
+        if name.endswith("_lock"):
+            self.row = ("pending", 1, self.db.admin)
+        elif name == "is_admin":
+            self.row = (self.db.admin,)
+        else:
+            self.row = None
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.prepared = set()
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self, self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, db):
+        self.db = db
+        self.conn = FakeConn(db)
+
+    @contextmanager
+    def connection(self):
+        self.db.connections += 1
+        yield self.conn
+
+
+def call(mod, db, name):
+    db.connections, db.executed = 0, []
+    event = {**EVENTS[name], "headers": {"X-User-Id": USER}}
+    status = mod.handler(event, None)["statusCode"]
+    return {"status": status, "connections": db.connections,
+            "is_admin_queries": db.executed.count("is_admin"), "queries": len(db.executed)}
+
+
+def check(name):
+    mod = load_handler(name)
+    db = FakeDB()
+    mod.POOL = FakePool(db)
+    # Попутный пересчёт трендов после записи берёт своё соединение и к проверке прав не относится
+    if hasattr(mod, "refresh_trending_after_write"):
+        mod.refresh_trending_after_write = lambda: None
+    mod.ADMINS.entries.clear()
+    miss = call(mod, db, name)
+    hit = call(mod, db, name)
+
+    # Выдача прав без Redis: отрицательный ответ держится не дольше negative_ttl
+    db.admin = False
+    mod.ADMINS.entries.clear()
+    call(mod, db, name)
+    db.admin = True
+    start = time.monotonic()
+    while call(mod, db, name)["status"] == 403:
+        time.sleep(0.02)
+    granted_after = round(time.monotonic() - start, 3)
+
+    # Модерация складывает проверку прав в запрос блокировки; верификация канала — отдельный is_admin
+    folded = name != "channels"
+    ok = (miss["status"] == hit["status"] == 200
+          and miss["connections"] == hit["connections"] == 1
+          and hit["is_admin_queries"] == 0
+          and (miss["is_admin_queries"] == 0 if folded else miss["is_admin_queries"] <= 1)
+          and granted_after <= mod.ADMINS.negative_ttl + 0.1)
+    return {"miss": miss, "hit": hit, "grant_visible_after_s": granted_after,
+            "negative_ttl": mod.ADMINS.negative_ttl, "ok": ok}
+
+
+def main():
+    # Короткий TTL отрицательного ответа, чтобы замер выдачи прав шёл доли секунды
+    os.environ["ADMIN_CACHE_NEGATIVE_TTL"] = "0.3"
+    report = {name: check(name) for name in EVENTS}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(r["ok"] for r in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Проверка: поиск кода в /auth/verify-admin-code остаётся index-only scan по
+idx_admin_codes_unused без сортировки даже при миллионе устаревших строк, а чистка удаляет
+их порциями до конца.
+
+    DATABASE_URL=postgres://... python bench/admin_codes_lookup.py [--rows 1000000]
+
+Схема должна быть накатана (db_migrations/). Завершается с кодом 1, если план не тот
+(другой индекс или Sort поверх скана) или после чистки остались устаревшие коды.
+"""
+import argparse
+import json
+import sys
+import time
+
+import psycopg2
+
+from views_hot_article import load_handler
+
+TELEGRAM_ID = 777000
+
+
+def find_nodes(plan, kind):
+    found = [plan] if plan.get("Node Type") == kind else []
+    for child in plan.get("Plans", []):
+        found.extend(find_nodes(child, kind))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    auth = load_handler("auth")
+    schema = auth.SCHEMA
+    with auth.get_conn() as conn:
+        cur = conn.cursor()
+        # Устаревшие строки: половина использована, половина просрочена
+        cur.execute(
+            f"""INSERT INTO {schema}.admin_codes (telegram_id, code, expires_at, used, created_at)
+                SELECT %s + g %% 1000, lpad((g %% 1000000)::text, 6, '0'),
+                       NOW() - INTERVAL '1 day', g %% 2 = 0, NOW() - INTERVAL '1 day'
+                FROM generate_series(1, %s) g""",
+            (TELEGRAM_ID, args.rows)
+        )
+        cur.execute(
+            f"INSERT INTO {schema}.admin_codes (telegram_id, code, expires_at) VALUES (%s, '123456', NOW() + INTERVAL '10 minutes')",
+            (TELEGRAM_ID,)
+        )
+        conn.commit()
+        cur.close()
+
+    # VACUUM нельзя в транзакции; он же заполняет карту видимости для index-only scan
+    vac = psycopg2.connect(auth.os.environ["DATABASE_URL"])
+    vac.autocommit = True
+    vac.cursor().execute(f"VACUUM ANALYZE {schema}.admin_codes")
+    vac.close()
+
+    with auth.get_conn() as conn:
+        cur = conn.cursor()
+        query = auth.QUERIES["admin_code_find"].replace("$1", "%s").replace("$2", "%s")
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, (TELEGRAM_ID, "123456"))
+        plan = cur.fetchone()[0][0]
+        cur.close()
+    scans = find_nodes(plan["Plan"], "Index Only Scan")
+    sorts = find_nodes(plan["Plan"], "Sort")
+    ok = any(s.get("Index Name") == "idx_admin_codes_unused" for s in scans) and not sorts
+
+    start = time.perf_counter()
+    deleted = auth.purge_admin_codes(max_batches=10 ** 6)
+    purge_seconds = round(time.perf_counter() - start, 2)
+    with auth.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM {schema}.admin_codes WHERE used OR expires_at < NOW()")
+        stale_left = cur.fetchone()[0]
+        cur.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "index_only": ok,
+        "indexes": sorted({n.get("Index Name") for n in find_nodes(plan["Plan"], "Index Scan") + scans}),
+        "sort": bool(sorts),
+        "lookup_ms": plan["Execution Time"],
+        "heap_fetches": [s.get("Heap Fetches") for s in scans],
+        "purged": deleted,
+        "purge_seconds": purge_seconds,
+        "stale_left": stale_left,
+    }, indent=2))
+    sys.exit(0 if ok and not stale_left else 1)
+
+
+if __name__ == "__main__":
+    main()
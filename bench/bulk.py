@@ -0,0 +1,376 @@
+"""
+Массовая выгрузка, загрузка и генерация данных через COPY.
+
+    DATABASE_URL=postgres://... python bench/bulk.py export --dir dump/ [--format ndjson|csv] [--tables users,articles]
+    DATABASE_URL=postgres://... python bench/bulk.py import --dir dump/ [--format ndjson|csv] [--no-counters]
+    DATABASE_URL=postgres://... python bench/bulk.py generate --load --users 10000 --articles 100000 \
+        --comments 1000000 --comment-skew 1.2
+    python bench/bulk.py generate --dir synthetic/ --format csv ...
+
+Схема должна быть накатана (db_migrations/). Файлы — по одному на таблицу (<dir>/<table>.csv
+или .ndjson), загружаются в порядке внешних ключей: users, channels, articles, comments.
+Строки идут потоком через COPY ... FROM STDIN / TO STDOUT, память не растёт с объёмом.
+Набор колонок берётся из заголовка CSV или ключей первой записи NDJSON; отсутствующие
+колонки получают значения по умолчанию, id сохраняются как есть. После загрузки
+последовательности SERIAL сдвигаются на MAX(id), денормализованные счётчики пересчитываются,
+опубликованные статьи ставятся в очередь trending (--no-counters отключает последние два шага).
+
+generate пишет синтетику теми же потоками: сразу в БД (--load, id продолжают существующие)
+или в файлы (id с 1, для пустой БД). Распределения степенные: --comment-skew задаёт, насколько
+комментарии сосредоточены на свежих статьях, --author-skew и --channel-skew — на активных
+авторах и крупных каналах (0 — равномерно).
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+SCHEMA = "t_p60467862_wild_politics_portal"
+
+# Порядок важен: загрузка идёт по внешним ключам. search_tsv генерируется базой и не выгружается
+TABLES = {
+    "users": ("id", "telegram_id", "username", "first_name", "last_name", "photo_url", "is_admin", "created_at"),
+    "channels": ("id", "name", "description", "icon", "color", "verification_type", "is_verified",
+                 "created_by", "created_at", "post_count", "updated_at"),
+    "articles": ("id", "title", "content", "excerpt", "channel_id", "author_id", "status", "views",
+                 "is_breaking", "created_at", "comment_count", "updated_at"),
+    "comments": ("id", "article_id", "author_id", "text", "status", "created_at"),
+}
+
+FORMATS = ("ndjson", "csv")
+
+# NDJSON выгружается как CSV с символами-разделителями, которых нет в выводе row_to_json:
+# строки JSON тогда не экранируются и не берутся в кавычки
+NDJSON_COPY = "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'"
+
+COMMENT_COUNT_FIX = f"""
+    UPDATE {SCHEMA}.articles a SET comment_count = x.n, updated_at = clock_timestamp()
+    FROM (SELECT a.id, COUNT(c.id) AS n FROM {SCHEMA}.articles a
+          LEFT JOIN {SCHEMA}.comments c ON c.article_id = a.id AND c.status = 'approved'
+          GROUP BY a.id) x
+    WHERE x.id = a.id AND a.comment_count <> x.n
+"""
+
+POST_COUNT_FIX = f"""
+    UPDATE {SCHEMA}.channels c SET post_count = x.n, updated_at = clock_timestamp()
+    FROM (SELECT c.id, COUNT(a.id) AS n FROM {SCHEMA}.channels c
+          LEFT JOIN {SCHEMA}.articles a ON a.channel_id = c.id AND a.status = 'published'
+          GROUP BY c.id) x
+    WHERE x.id = c.id AND c.post_count <> x.n
+"""
+
+TRENDING_ENQUEUE = f"""
+    INSERT INTO {SCHEMA}.article_trending_dirty (article_id)
+    SELECT id FROM {SCHEMA}.articles WHERE status = 'published'
+    ON CONFLICT DO NOTHING
+"""
+
+WORDS = ("власть", "закон", "выборы", "депутат", "бюджет", "реформа", "налог", "регион", "суд",
+         "партия", "министр", "указ", "митинг", "оппозиция", "голосование", "проект", "совет",
+         "губернатор", "решение", "заявление", "расследование", "санкции", "экономика", "дума")
+NAMES = ("Алексей", "Мария", "Иван", "Ольга", "Дмитрий", "Анна", "Сергей", "Елена", "Павел", "Наталья")
+ICONS = ("Newspaper", "Landmark", "Scale", "Megaphone", "Globe", "Vote")
+COLORS = ("bg-blue-700", "bg-red-700", "bg-green-700", "bg-purple-700", "bg-gray-700")
+VERIFICATION_TYPES = ("government", "political", "medical", "news")
+
+# Генерируемая таблица требует строк в тех, на которые ссылается
+REFERENCES = {"channels": ("users",), "articles": ("users", "channels"), "comments": ("users", "articles")}
+
+
+class IterFile:
+    """Файлоподобная обёртка над генератором строк для copy_expert: читает кусками по запросу."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buf = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buf) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buf += chunk
+        if size < 0:
+            size = len(self.buf)
+        out, self.buf = self.buf[:size], self.buf[size:]
+        return out
+
+
+def csv_field(value):
+    # Как в COPY csv: NULL — пустое поле без кавычек, пустая строка — "", остальное в кавычках
+    if value is None:
+        return ""
+    if isinstance(value, (bool, int, float)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def csv_lines(rows):
+    for row in rows:
+        yield ",".join(map(csv_field, row)) + "\n"
+
+
+def check_columns(table, columns):
+    unknown = [c for c in columns if c not in TABLES[table]]
+    if unknown or not columns:
+        sys.exit(f"{table}: unknown columns {unknown}" if unknown else f"{table}: no columns")
+    return columns
+
+
+def copy_in(cur, table, columns, stream):
+    cols = ", ".join(columns)
+    cur.copy_expert(f"COPY {SCHEMA}.{table} ({cols}) FROM STDIN WITH (FORMAT csv)", stream)
+    return cur.rowcount
+
+
+def import_csv(cur, table, f):
+    # Заголовок задаёт колонки, остаток файла уходит в COPY как есть
+    header = next(csv.reader([f.readline()]), [])
+    if not header:
+        return 0
+    return copy_in(cur, table, check_columns(table, header), f)
+
+
+def import_ndjson(cur, table, f):
+    records = (json.loads(line) for line in f if line.strip())
+    first = next(records, None)
+    if first is None:
+        return 0
+    columns = check_columns(table, list(first))
+    rows = ([record.get(c) for c in columns] for record in itertools.chain([first], records))
+    return copy_in(cur, table, columns, IterFile(csv_lines(rows)))
+
+
+def export_table(cur, table, fmt, f):
+    select = f"SELECT {', '.join(TABLES[table])} FROM {SCHEMA}.{table} ORDER BY id"
+    if fmt == "csv":
+        cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", f)
+    else:
+        cur.copy_expert(f"COPY (SELECT row_to_json(t) FROM ({select}) t) TO STDOUT WITH ({NDJSON_COPY})", f)
+    return cur.rowcount
+
+
+def fix_sequences(cur, tables):
+    for table in tables:
+        cur.execute(
+            f"""SELECT setval(pg_get_serial_sequence('{SCHEMA}.{table}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL)
+                FROM {SCHEMA}.{table}"""
+        )
+
+
+def finalize(conn, tables, counters):
+    cur = conn.cursor()
+    fix_sequences(cur, tables)
+    done = {"sequences": list(tables)}
+    if counters:
+        cur.execute(COMMENT_COUNT_FIX)
+        done["articles_recounted"] = cur.rowcount
+        cur.execute(POST_COUNT_FIX)
+        done["channels_recounted"] = cur.rowcount
+        cur.execute(TRENDING_ENQUEUE)
+        done["trending_enqueued"] = cur.rowcount
+    conn.commit()
+    cur.close()
+    return done
+
+
+def path_for(directory, table, fmt):
+    return os.path.join(directory, f"{table}.{fmt}")
+
+
+def cmd_export(conn, args, tables):
+    os.makedirs(args.dir, exist_ok=True)
+    report = {}
+    # Один снимок на все таблицы, чтобы внешние ключи в выгрузке сходились
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cur = conn.cursor()
+    for table in tables:
+        start = time.perf_counter()
+        with open(path_for(args.dir, table, args.format), "w", encoding="utf-8") as f:
+            rows = export_table(cur, table, args.format, f)
+        report[table] = {"rows": rows, "seconds": round(time.perf_counter() - start, 3)}
+    conn.commit()
+    cur.close()
+    return report
+
+
+def cmd_import(conn, args, tables):
+    report = {}
+    cur = conn.cursor()
+    for table in tables:
+        path = path_for(args.dir, table, args.format)
+        if not os.path.exists(path):
+            continue
+        start = time.perf_counter()
+        with open(path, encoding="utf-8") as f:
+            rows = (import_csv if args.format == "csv" else import_ndjson)(cur, table, f)
+        # Каждая таблица — своя транзакция: ошибка COPY откатывает только её
+        conn.commit()
+        report[table] = {"rows": rows, "seconds": round(time.perf_counter() - start, 3)}
+    cur.close()
+    report["finalize"] = finalize(conn, list(report), not args.no_counters)
+    return report
+
+
+def skewed(rnd, n, s):
+    # Ранг 1..n с плотностью ~ 1/x^s (обратная функция непрерывного степенного закона), O(1) памяти
+    u = rnd.random()
+    if s <= 0:
+        x = 1 + u * n
+    elif abs(s - 1) < 1e-9:
+        x = n ** u
+    else:
+        x = ((n ** (1 - s) - 1) * u + 1) ** (1 / (1 - s))
+    return min(n, int(x))
+
+
+def sentence(rnd, lo, hi):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(lo, hi))).capitalize() + "."
+
+
+def synthetic(args, base):
+    """Генераторы строк по таблицам; id начинаются после base[table], время — в окне --days."""
+    rnd = random.Random(args.random_seed)
+    now = datetime.now().replace(microsecond=0)
+    start = now - timedelta(days=args.days)
+    span = (now - start).total_seconds()
+    u0, ch0, a0, c0, tg0 = base["users"], base["channels"], base["articles"], base["comments"], base["telegram_id"]
+
+    def status(pending, rejected, ok):
+        r = rnd.random()
+        return "pending" if r < pending else "rejected" if r < pending + rejected else ok
+
+    def article_time(i):
+        # Статьи равномерно по окну, id растёт вместе со временем
+        return start + timedelta(seconds=span * i / max(1, args.articles))
+
+    def users():
+        for i in range(1, args.users + 1):
+            yield (u0 + i, tg0 + i, f"user{u0 + i}", rnd.choice(NAMES), None, None, i == 1 and args.admin,
+                   start + timedelta(seconds=rnd.random() * span))
+
+    def channels():
+        for i in range(1, args.channels + 1):
+            verified = rnd.random() < 0.3
+            yield (ch0 + i, f"Канал {ch0 + i}", sentence(rnd, 5, 12), rnd.choice(ICONS), rnd.choice(COLORS),
+                   rnd.choice(VERIFICATION_TYPES) if verified else None, verified, u0 + skewed(rnd, args.users, args.author_skew),
+                   start, 0, now)
+
+    def articles():
+        for i in range(1, args.articles + 1):
+            content = " ".join(sentence(rnd, 8, 20) for _ in range(rnd.randint(3, args.paragraphs)))
+            created = article_time(i)
+            yield (a0 + i, sentence(rnd, 3, 9), content, content[:200], ch0 + skewed(rnd, args.channels, args.channel_skew),
+                   u0 + skewed(rnd, args.users, args.author_skew), status(args.pending, 0.02, "published"),
+                   int(rnd.paretovariate(args.views_alpha) * 10), rnd.random() < 0.02, created, 0, created)
+
+    def comments():
+        for i in range(1, args.comments + 1):
+            # Ранг 1 — самая свежая статья: комментарии копятся у новых материалов
+            idx = args.articles + 1 - skewed(rnd, args.articles, args.comment_skew)
+            created = min(now, article_time(idx) + timedelta(hours=rnd.expovariate(1 / args.comment_hours)))
+            yield (c0 + i, a0 + idx, u0 + skewed(rnd, args.users, args.author_skew), sentence(rnd, 2, 25),
+                   status(args.pending, 0.02, "approved"), created)
+
+    return {"users": users, "channels": channels, "articles": articles, "comments": comments}
+
+
+def write_rows(f, fmt, columns, rows):
+    if fmt == "csv":
+        f.write(",".join(columns) + "\n")
+        f.writelines(csv_lines(rows))
+        return
+    for row in rows:
+        record = dict(zip(columns, row))
+        f.write(json.dumps(record, ensure_ascii=False, default=datetime.isoformat) + "\n")
+
+
+def cmd_generate(conn, args):
+    sizes = {"users": args.users, "channels": args.channels, "articles": args.articles, "comments": args.comments}
+    for table, refs in REFERENCES.items():
+        missing = [ref for ref in refs if sizes[table] and not sizes[ref]]
+        if missing:
+            sys.exit(f"generate: {table} need --{' --'.join(missing)} > 0")
+    base = dict.fromkeys(("users", "channels", "articles", "comments", "telegram_id"), 0)
+    if conn:
+        cur = conn.cursor()
+        for table in TABLES:
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {SCHEMA}.{table}")
+            base[table] = cur.fetchone()[0]
+        cur.execute(f"SELECT COALESCE(MAX(telegram_id), 0) FROM {SCHEMA}.users")
+        base["telegram_id"] = cur.fetchone()[0]
+        conn.commit()
+    gens = synthetic(args, base)
+    report = {}
+    for table in TABLES:
+        if not sizes[table]:
+            continue
+        start = time.perf_counter()
+        # Кортежи генератора идут в порядке TABLES[table]
+        rows = gens[table]()
+        if conn:
+            copy_in(cur, table, TABLES[table], IterFile(csv_lines(rows)))
+            conn.commit()
+        else:
+            os.makedirs(args.dir, exist_ok=True)
+            with open(path_for(args.dir, table, args.format), "w", encoding="utf-8") as f:
+                write_rows(f, args.format, TABLES[table], rows)
+        report[table] = {"rows": sizes[table], "seconds": round(time.perf_counter() - start, 3)}
+    if conn:
+        cur.close()
+        report["finalize"] = finalize(conn, list(TABLES), True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "import", "generate"):
+        p = sub.add_parser(name)
+        p.add_argument("--dir", required=name != "generate")
+        p.add_argument("--format", choices=FORMATS, default="ndjson")
+        if name != "generate":
+            p.add_argument("--tables", default=",".join(TABLES))
+    sub.choices["import"].add_argument("--no-counters", action="store_true",
+                                       help="не пересчитывать comment_count/post_count и очередь trending")
+    gen = sub.choices["generate"]
+    gen.add_argument("--load", action="store_true", help="писать сразу в БД, а не в --dir")
+    gen.add_argument("--users", type=int, default=1000)
+    gen.add_argument("--channels", type=int, default=20)
+    gen.add_argument("--articles", type=int, default=10000)
+    gen.add_argument("--comments", type=int, default=100000)
+    gen.add_argument("--comment-skew", type=float, default=1.1, help="степень концентрации комментариев на свежих статьях")
+    gen.add_argument("--author-skew", type=float, default=1.0)
+    gen.add_argument("--channel-skew", type=float, default=0.8)
+    gen.add_argument("--views-alpha", type=float, default=1.5, help="параметр Парето для просмотров")
+    gen.add_argument("--comment-hours", type=float, default=12, help="среднее время от статьи до комментария")
+    gen.add_argument("--pending", type=float, default=0.1, help="доля статей и комментариев на модерации")
+    gen.add_argument("--paragraphs", type=int, default=8)
+    gen.add_argument("--days", type=int, default=90)
+    gen.add_argument("--admin", action="store_true", help="первый сгенерированный пользователь — админ")
+    gen.add_argument("--random-seed", type=int, default=None, help="воспроизводимая генерация")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        if not args.load and not args.dir:
+            sys.exit("generate: --load or --dir is required")
+        conn = psycopg2.connect(os.environ["DATABASE_URL"]) if args.load else None
+        report = cmd_generate(conn, args)
+    else:
+        tables = [t for t in TABLES if t in args.tables.split(",")]
+        conn = psycopg2.connect(os.environ["DATABASE_URL"])
+        report = (cmd_export if args.command == "export" else cmd_import)(conn, args, tables)
+    if conn:
+        conn.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Бенчмарк модерации N комментариев: по одному через PUT /moderate
+против пачек через PUT /moderate/batch.
+
+    DATABASE_URL=postgres://... python bench/bulk_moderation.py [--comments 5000] [--batch 1000]
+
+Схема должна быть накатана (db_migrations/). Скрипт создаёт админа, статью и комментарии.
+"""
+import argparse
+import json
+import time
+
+from views_hot_article import load_handler, seed as seed_article
+
+
+def seed_comments(mod, article_id, count):
+    with mod.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""INSERT INTO {mod.SCHEMA}.users (telegram_id, first_name, is_admin)
+                VALUES (-floor(random() * 1e12)::bigint, 'bench', TRUE) RETURNING id"""
+        )
+        admin_id = cur.fetchone()[0]
+        cur.execute(
+            f"""INSERT INTO {mod.SCHEMA}.comments (article_id, author_id, text, status)
+                SELECT %s, %s, 'комментарий ' || g, 'pending' FROM generate_series(1, %s) g RETURNING id""",
+            (article_id, admin_id, count)
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    return admin_id, ids
+
+
+def put(mod, admin_id, path, body):
+    event = {"httpMethod": "PUT", "path": path, "headers": {"X-User-Id": str(admin_id)}, "body": json.dumps(body)}
+    response = mod.handler(event, None)
+    assert response["statusCode"] == 200, response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    article_id = seed_article(load_handler("articles"))
+    mod = load_handler("comments")
+    results = {}
+
+    admin_id, ids = seed_comments(mod, article_id, args.comments)
+    start = time.perf_counter()
+    for comment_id in ids:
+        put(mod, admin_id, "/moderate", {"comment_id": comment_id, "action": "approve"})
+    results["one_by_one"] = round(time.perf_counter() - start, 3)
+
+    admin_id, ids = seed_comments(mod, article_id, args.comments)
+    start = time.perf_counter()
+    for i in range(0, len(ids), args.batch):
+        put(mod, admin_id, "/moderate/batch", {"items": [{"id": c, "action": "approve"} for c in ids[i:i + args.batch]]})
+    results["batched"] = round(time.perf_counter() - start, 3)
+
+    print(json.dumps({"comments": args.comments, "batch": args.batch, "seconds": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
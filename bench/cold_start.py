@@ -0,0 +1,102 @@
+"""
+Холодный старт и стоимость маршрутизации функций, без БД.
+
+    python bench/cold_start.py [--runs 20] [--iterations 100000]
+
+Импорт каждого index.py замеряется в отдельном процессе (медиана и минимум по --runs),
+заодно проверяется, что драйвер БД и http.client при импорте не загружаются. Диспетчеризация
+замеряется в процессе: OPTIONS, промах (404 на PUT, проход по всей таблице метода) и поиск
+маршрута для путей из таблицы. Результат — JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from views_hot_article import load_handler
+
+FUNCTIONS = ("articles", "channels", "comments", "auth")
+BENCH = os.path.dirname(os.path.abspath(__file__))
+
+# Пути, на которых замеряется поиск маршрута (только сопоставление, без вызова)
+PATHS = {
+    "articles": [("GET", "/articles"), ("GET", "/articles/42"), ("GET", "/articles/search"),
+                 ("POST", "/articles"), ("PUT", "/articles/42/moderate")],
+    "channels": [("GET", "/"), ("POST", "/create"), ("PUT", "/verify")],
+    "comments": [("GET", "/"), ("GET", "/previews"), ("POST", "/"), ("PUT", "/moderate")],
+    "auth": [("POST", "/telegram"), ("POST", "/verify-admin-code")],
+}
+
+IMPORT_PROBE = """
+import sys, time
+sys.path.insert(0, {bench!r})
+from views_hot_article import load_handler
+start = time.perf_counter()
+load_handler({name!r})
+print(time.perf_counter() - start, "psycopg2" in sys.modules, "http.client" in sys.modules)
+"""
+
+
+def cold_import(name, runs):
+    samples, driver_loaded, http_loaded = [], False, False
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(bench=BENCH, name=name)],
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        samples.append(float(out[0]) * 1000)
+        driver_loaded = driver_loaded or out[1] == "True"
+        http_loaded = http_loaded or out[2] == "True"
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "driver_loaded_on_import": driver_loaded,
+        "http_client_loaded_on_import": http_loaded,
+    }
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+
+def dispatch(name, iterations):
+    mod = load_handler(name)
+    options = {"httpMethod": "OPTIONS", "path": "/"}
+    # Промах замеряется на PUT: у GET/POST в channels и comments есть маршруты «на всё остальное»
+    miss = {"httpMethod": "PUT", "path": "/no/such/route", "headers": {}}
+
+    def lookup():
+        for method, path in PATHS[name]:
+            for pattern, _ in mod.ROUTES.routes.get(method, ()):
+                if pattern.search(path):
+                    break
+
+    return {
+        "options_us": per_call_us(lambda: mod.handler(options, None), iterations),
+        "not_found_us": per_call_us(lambda: mod.handler(miss, None), iterations),
+        "lookup_us": round(per_call_us(lookup, iterations) / len(PATHS[name]), 3),
+        "routes": sum(len(r) for r in mod.ROUTES.routes.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    report = {
+        name: {"import": cold_import(name, args.runs), "dispatch": dispatch(name, args.iterations)}
+        for name in FUNCTIONS
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Нагрузочный прогон функций локально: handler(event, context) вызывается напрямую.
+
+    DATABASE_URL=postgres://... python bench/load.py --seed --scale 1 \
+        --mix feed=50,detail=30,comments=10,comment_post=5,moderation=5,tests=0 \
+        --concurrency 8 --duration 20 --out report.json [--baseline old.json --tolerance 0.1]
+
+События берутся из backend/*/tests.json (маршрут "tests") и из синтетической смеси.
+Отчёт — JSON: пропускная способность, перцентили задержки, запросов и новых соединений
+с БД на запрос по каждому маршруту. С --baseline сравнивает с прошлым отчётом и
+завершается с кодом 1 при регрессии больше --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import psycopg2.extensions
+
+from views_hot_article import ROOT, load_handler
+
+FUNCTIONS = ("articles", "channels", "comments", "auth")
+DEFAULT_MIX = "feed=50,detail=30,comments=10,comment_post=5,moderation=5,tests=0"
+
+counters = threading.local()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        counters.queries = getattr(counters, "queries", 0) + 1
+        return super().execute(query, vars)
+
+
+def instrument(mod):
+    # Считаем запросы (через cursor_factory) и новые соединения (через ConnPool._connect)
+    connect = mod.ConnPool._connect
+
+    def counting_connect(pool):
+        counters.connections = getattr(counters, "connections", 0) + 1
+        conn = connect(pool)
+        conn.cursor_factory = CountingCursor
+        return conn
+
+    mod.ConnPool._connect = counting_connect
+
+
+def seed(mod, scale):
+    schema = mod.SCHEMA
+    users, channels, articles, comments = 1000 * scale, 10 * scale, 2000 * scale, 20000 * scale
+    with mod.get_conn() as conn:
+        cur = conn.cursor()
+
+        def insert(sql, args):
+            # Вставка одним запросом; id из одной последовательности идут подряд
+            cur.execute(f"WITH ins AS ({sql} RETURNING id) SELECT MIN(id) FROM ins", args)
+            return cur.fetchone()[0]
+
+        cur.execute(f"SELECT COALESCE(MAX(telegram_id), 0) + 1 FROM {schema}.users")
+        base = cur.fetchone()[0]
+        first_user = insert(
+            f"""INSERT INTO {schema}.users (telegram_id, username, first_name, is_admin)
+                SELECT %s + g, 'load' || g, 'Нагрузка ' || g, g = 0 FROM generate_series(0, %s - 1) g""",
+            (base, users)
+        )
+        first_channel = insert(
+            f"""INSERT INTO {schema}.channels (name, description, is_verified, created_by)
+                SELECT 'Канал ' || g, 'Описание', g %% 3 = 0, %s FROM generate_series(1, %s) g""",
+            (first_user, channels)
+        )
+        first_article = insert(
+            f"""INSERT INTO {schema}.articles (title, content, excerpt, channel_id, author_id, status, is_breaking, created_at)
+                SELECT 'Статья ' || g, repeat('Текст статьи. ', 40), 'Текст статьи.',
+                       %s + g %% %s, %s + g %% %s,
+                       CASE WHEN g %% 10 = 0 THEN 'pending' ELSE 'published' END,
+                       g %% 50 = 0, NOW() - g * INTERVAL '1 minute'
+                FROM generate_series(1, %s) g""",
+            (first_channel, channels, first_user, users, articles)
+        )
+        # Комментарии смещены к свежим статьям: квадрат равномерного распределения
+        insert(
+            f"""INSERT INTO {schema}.comments (article_id, author_id, text, status)
+                SELECT %s + LEAST(%s - 1, floor(random() ^ 2 * %s)::int), %s + g %% %s,
+                       'Комментарий ' || g, CASE WHEN g %% 5 = 0 THEN 'pending' ELSE 'approved' END
+                FROM generate_series(1, %s) g""",
+            (first_article, articles, articles, first_user, users, comments)
+        )
+        conn.commit()
+        cur.close()
+    # Денормализованные счётчики после прямой вставки
+    with mod.get_conn() as conn:
+        mod.check_counters(conn, fix=True)
+
+
+def load_ids(mod):
+    schema = mod.SCHEMA
+    with mod.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id FROM {schema}.articles WHERE status='published' ORDER BY id DESC LIMIT 5000")
+        articles = [r[0] for r in cur.fetchall()]
+        cur.execute(f"SELECT id FROM {schema}.users ORDER BY id DESC LIMIT 1000")
+        users = [r[0] for r in cur.fetchall()]
+        cur.execute(f"SELECT id FROM {schema}.users WHERE is_admin ORDER BY id DESC LIMIT 1")
+        admin = cur.fetchone()
+        cur.execute(f"SELECT id FROM {schema}.comments ORDER BY id DESC LIMIT 20000")
+        comments = [r[0] for r in cur.fetchall()]
+        cur.close()
+    if not articles or not users or not admin:
+        sys.exit("no data: run with --seed first")
+    return {"articles": articles, "users": users, "admin": admin[0], "comments": comments}
+
+
+def spec_events():
+    # События из tests.json: (функция, event, ожидаемый статус)
+    events = []
+    for name in FUNCTIONS:
+        with open(os.path.join(ROOT, "backend", name, "tests.json")) as f:
+            for test in json.load(f)["tests"]:
+                event = {"httpMethod": test["method"], "path": test["path"], "headers": {}, "queryStringParameters": {}}
+                if "body" in test:
+                    event["body"] = json.dumps(test["body"])
+                events.append((name, event, test["expectedStatus"]))
+    return events
+
+
+def make_event(route, ids, specs):
+    if route == "tests":
+        return random.choice(specs)
+    if route == "feed":
+        return "articles", {"httpMethod": "GET", "path": "/articles", "headers": {}, "queryStringParameters": {"limit": "20"}}, 200
+    if route == "detail":
+        return "articles", {"httpMethod": "GET", "path": f"/articles/{random.choice(ids['articles'])}", "headers": {}}, 200
+    if route == "comments":
+        article_id = str(random.choice(ids["articles"]))
+        return "comments", {"httpMethod": "GET", "path": "/", "headers": {}, "queryStringParameters": {"article_id": article_id}}, 200
+    if route == "comment_post":
+        body = {"article_id": random.choice(ids["articles"]), "text": "Нагрузочный комментарий"}
+        headers = {"X-User-Id": str(random.choice(ids["users"]))}
+        return "comments", {"httpMethod": "POST", "path": "/", "headers": headers, "body": json.dumps(body)}, 200
+    if route == "moderation":
+        body = {"comment_id": random.choice(ids["comments"]), "action": random.choice(("approve", "reject"))}
+        headers = {"X-User-Id": str(ids["admin"])}
+        return "comments", {"httpMethod": "PUT", "path": "/moderate", "headers": headers, "body": json.dumps(body)}, 200
+    raise ValueError(f"unknown route {route}")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[k] * 1000, 3)
+
+
+def run(mods, mix, ids, specs, concurrency, duration, requests):
+    routes = [r for r, w in mix if w > 0]
+    weights = [w for r, w in mix if w > 0]
+    samples = {r: [] for r in routes}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+    issued = [0]
+
+    def worker():
+        local = []
+        while time.monotonic() < stop:
+            with lock:
+                if requests and issued[0] >= requests:
+                    break
+                issued[0] += 1
+            route = random.choices(routes, weights)[0]
+            name, event, expected = make_event(route, ids, specs)
+            counters.queries = counters.connections = 0
+            start = time.perf_counter()
+            try:
+                status = mods[name].handler(event, None)["statusCode"]
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - start
+            ok = status == expected or (expected == 200 and status == 304)
+            local.append((route, elapsed, ok, counters.queries, counters.connections))
+        with lock:
+            for route, *rest in local:
+                samples[route].append(rest)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    return samples, wall
+
+
+def summarize(samples, wall):
+    def stats(rows):
+        latencies = sorted(r[0] for r in rows)
+        n = len(rows)
+        return {
+            "count": n,
+            "errors": sum(1 for r in rows if not r[1]),
+            "rps": round(n / wall, 1),
+            "p50_ms": percentile(latencies, 50),
+            "p90_ms": percentile(latencies, 90),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+            "queries_per_request": round(sum(r[2] for r in rows) / n, 3) if n else None,
+            "connections_per_request": round(sum(r[3] for r in rows) / n, 4) if n else None,
+        }
+
+    every = [row for rows in samples.values() for row in rows]
+    return {"total": stats(every), "routes": {route: stats(rows) for route, rows in samples.items()}}
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for route, cur in report["routes"].items():
+        old = baseline.get("routes", {}).get(route)
+        if not old or not cur["count"] or not old["count"]:
+            continue
+        if cur["rps"] < old["rps"] * (1 - tolerance):
+            found.append(f"{route}: rps {old['rps']} -> {cur['rps']}")
+        if old["p99_ms"] and cur["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            found.append(f"{route}: p99 {old['p99_ms']}ms -> {cur['p99_ms']}ms")
+        if cur["queries_per_request"] > old["queries_per_request"] * (1 + tolerance):
+            found.append(f"{route}: queries/request {old['queries_per_request']} -> {cur['queries_per_request']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true", help="заполнить БД синтетическими данными")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=0, help="остановиться после N запросов")
+    parser.add_argument("--out")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_POOL_SIZE", str(args.concurrency))
+    mods = {name: load_handler(name) for name in FUNCTIONS}
+    for mod in mods.values():
+        instrument(mod)
+    if args.seed:
+        seed(mods["articles"], args.scale)
+    ids = load_ids(mods["articles"])
+    mix = [(r, float(w)) for r, w in (item.split("=") for item in args.mix.split(","))]
+
+    samples, wall = run(mods, mix, ids, spec_events(), args.concurrency, args.duration, args.requests)
+    report = {
+        "config": {"mix": dict(mix), "concurrency": args.concurrency, "duration": round(wall, 3), "scale": args.scale},
+        **summarize(samples, wall),
+    }
+    failed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed = regressions(report, json.load(f), args.tolerance)
+        report["regressions"] = failed
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
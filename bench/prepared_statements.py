@@ -0,0 +1,83 @@
+"""
+Микробенчмарк: разбор+план+выполнение запросов ленты и комментариев —
+f-строка с подставленными значениями против именованного PREPARE/EXECUTE.
+
+    DATABASE_URL=postgres://... python bench/prepared_statements.py [--iterations 2000]
+
+Схема должна быть накатана (db_migrations/) и заполнена данными.
+"""
+import argparse
+import json
+import time
+
+from views_hot_article import load_handler
+
+
+def measure(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    articles = load_handler("articles")
+    comments = load_handler("comments")
+    schema = articles.SCHEMA
+    results = {}
+
+    with articles.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT article_id FROM {schema}.comments GROUP BY article_id ORDER BY COUNT(*) DESC LIMIT 1")
+        row = cur.fetchone()
+        article_id = row[0] if row else 1
+
+        def feed_adhoc():
+            cur.execute(articles.FEED_COLUMNS + "WHERE a.status = 'published'" + articles.FEED_ORDER + " LIMIT 21")
+            cur.fetchall()
+
+        def feed_prepared():
+            articles.run(cur, "feed", ("published", 21))
+            cur.fetchall()
+
+        results["feed"] = {
+            "adhoc_us": measure(feed_adhoc, args.iterations),
+            "prepared_us": measure(feed_prepared, args.iterations),
+        }
+        conn.rollback()
+        cur.close()
+
+    # Первая страница комментариев, как её запрашивает list_comments: limit + 1 строк
+    page = comments.COMMENTS_DEFAULT_LIMIT + 1
+    with comments.get_conn() as conn:
+        cur = conn.cursor()
+
+        def comments_adhoc():
+            cur.execute(
+                comments.COMMENT_COLUMNS
+                + f"WHERE cm.status = 'approved' AND cm.article_id = {int(article_id)}"
+                + comments.COMMENT_ORDER + f" LIMIT {page}"
+            )
+            cur.fetchall()
+
+        def comments_prepared():
+            comments.run(cur, "comment_list_article", ("approved", article_id, page))
+            cur.fetchall()
+
+        results["comments"] = {
+            "adhoc_us": measure(comments_adhoc, args.iterations),
+            "prepared_us": measure(comments_prepared, args.iterations),
+        }
+        conn.rollback()
+        cur.close()
+
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Проверка read-your-writes поверх кэша ответов, без БД.
+
+    python bench/read_your_writes.py
+
+Для articles, channels и comments primary и реплика подменяются пулами-заглушками, которые
+отдают «версию» данных: primary уже видит запись, реплика отстаёт. Сценарий: запись
+(mark_write + инвалидация), анонимное чтение с реплики заполняет кэш старым ответом,
+затем читает сам писавший — он должен получить новый ответ с primary, а не HIT.
+Завершается с кодом 1, если хоть одна функция отдала писавшему старые данные.
+"""
+import json
+import sys
+from contextlib import contextmanager
+
+from views_hot_article import load_handler
+
+FUNCTIONS = ("articles", "channels", "comments")
+WRITER = "42"
+
+
+class FakeCursor:
+    def execute(self, query, args=None):
+        pass
+
+    def fetchone(self):
+        return (0,)
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, version):
+        self.version = version
+
+    def cursor(self):
+        # Запрос отставания реплики: 0 секунд, реплика считается здоровой
+        return FakeCursor()
+
+
+class FakePool:
+    """Пул, чьё соединение помнит только версию данных на своём сервере."""
+
+    def __init__(self, version):
+        self.version = version
+
+    @contextmanager
+    def connection(self):
+        yield FakeConn(self.version)
+
+
+def scenario(mod):
+    primary, replica = FakePool("v1"), FakePool("v1")
+    mod.POOL = primary
+    mod.REPLICAS.pools = [replica]
+    mod.REPLICAS.state = [{"ok": True, "checked": float("-inf"), "lag": None}]
+
+    def read(user_id):
+        def build():
+            with mod.get_read_conn(user_id) as conn:
+                return json.dumps({"version": conn.version})
+        event = {"headers": {"X-User-Id": user_id} if user_id else {}}
+        resp = mod.cached_response(event, "ryw", {}, ("ryw",), build)
+        return json.loads(resp["body"])["version"], resp["headers"]["X-Cache"]
+
+    read(None)
+    # Запись: primary видит v2, реплика ещё нет
+    primary.version = "v2"
+    mod.mark_write(WRITER)
+    mod.CACHE.invalidate("ryw")
+    anon = read(None)
+    writer = read(WRITER)
+    anon_again = read(None)
+    return {
+        "anon_after_write": anon,
+        "writer": writer,
+        "anon_cached": anon_again,
+        "ok": writer[0] == "v2",
+    }
+
+
+def main():
+    report = {name: scenario(load_handler(name)) for name in FUNCTIONS}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(r["ok"] for r in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
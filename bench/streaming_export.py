@@ -0,0 +1,79 @@
+"""
+Бенчмарк памяти и времени: fetchall + список dict + json.dumps против серверного курсора
+с потоковой сериализацией (stream_query + encode_rows) на синтетической таблице статей.
+
+    DATABASE_URL=postgres://... python bench/streaming_export.py [--articles 100000] [--batch 500]
+
+Если опубликованных статей меньше --articles, недостающие добавляются в канал 'bench-stream'.
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from views_hot_article import load_handler
+
+
+def seed(mod, count):
+    with mod.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM {mod.SCHEMA}.articles WHERE status='published'")
+        missing = count - cur.fetchone()[0]
+        if missing > 0:
+            cur.execute(f"INSERT INTO {mod.SCHEMA}.channels (name) VALUES ('bench-stream') RETURNING id")
+            channel_id = cur.fetchone()[0]
+            cur.execute(
+                f"""INSERT INTO {mod.SCHEMA}.articles (title, content, excerpt, channel_id, status, created_at)
+                    SELECT 'Статья ' || g, repeat('Текст статьи. ', 60), 'Текст статьи.', %s, 'published',
+                           NOW() - g * INTERVAL '1 minute'
+                    FROM generate_series(1, %s) g""",
+                (channel_id, missing)
+            )
+            conn.commit()
+        cur.close()
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = len(fn())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 3), "peak_mb": round(peak / 2**20, 1), "body_mb": round(size / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ["STREAM_BATCH"] = str(args.batch)
+    mod = load_handler("articles")
+    seed(mod, args.articles)
+    query = mod.QUERIES["article_export"].replace("$1", "%s")
+
+    def buffered():
+        with mod.get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(query, ("published",))
+            rows = cur.fetchall()
+            cur.close()
+            return json.dumps([mod.article_row_to_dict(r) for r in rows], ensure_ascii=False)
+
+    def streamed():
+        with mod.get_conn() as conn:
+            return mod.encode_rows(mod.stream_query(conn, "article_export", ("published",)), mod.article_row_to_dict)
+
+    def streamed_ndjson():
+        with mod.get_conn() as conn:
+            return mod.encode_rows(mod.stream_query(conn, "article_export", ("published",)), mod.article_row_to_dict, ndjson=True)
+
+    results = {"fetchall": measure(buffered), "stream": measure(streamed), "stream_ndjson": measure(streamed_ndjson)}
+    print(json.dumps({"articles": args.articles, "batch": args.batch, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Бенчмарк пропускной способности проверки данных Telegram Login Widget:
+прежняя реализация против verify_telegram_data (кэш секрета и повторов).
+
+    python bench/telegram_verify.py [--payloads 20000] [--repeat 5]
+
+БД не нужна: модуль auth только импортируется. Каждая скорость — лучшая из --repeat
+прогонов; перед прогоном свежих данных кэш повторов очищается.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from views_hot_article import load_handler
+
+TOKEN = "123456:bench-token"
+
+
+def legacy_verify(data):
+    token = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+    check_hash = data.pop("hash", "")
+    data_check_string = "\n".join(sorted([f"{k}={v}" for k, v in data.items()]))
+    secret_key = hashlib.sha256(token.encode()).digest()
+    return hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest() == check_hash
+
+
+def signed(i):
+    data = {"id": 100000 + i, "first_name": "Иван", "username": f"user{i}", "auth_date": int(time.time())}
+    check = "\n".join(f"{k}={data[k]}" for k in sorted(data))
+    data["hash"] = hmac.new(hashlib.sha256(TOKEN.encode()).digest(), check.encode(), hashlib.sha256).hexdigest()
+    return data
+
+
+def rate(fn, payloads, repeat, reset=None):
+    best = 0
+    for _ in range(repeat):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        for p in payloads:
+            assert fn(dict(p))
+        best = max(best, round(len(payloads) / (time.perf_counter() - start)))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payloads", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["TELEGRAM_BOT_TOKEN"] = TOKEN
+    auth = load_handler("auth")
+    payloads = [signed(i) for i in range(args.payloads)]
+    results = {
+        "legacy_per_sec": rate(legacy_verify, payloads, args.repeat),
+        "cached_secret_per_sec": rate(auth.verify_telegram_data, payloads, args.repeat, auth.forget_telegram_logins),
+        "replayed_per_sec": rate(auth.verify_telegram_data, payloads[-auth.TELEGRAM_SEEN_MAX:], args.repeat),
+    }
+    print(json.dumps({"payloads": args.payloads, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Бенчмарк: параллельное чтение одной «горячей» статьи при разных режимах счётчика просмотров.
+
+    DATABASE_URL=postgres://... python bench/views_hot_article.py [--threads 16] [--seconds 10]
+
+Схема должна быть накатана (db_migrations/). Скрипт создаёт одну статью и печатает JSON с
+пропускной способностью для режимов sync (UPDATE в каждом запросе), buffered и async.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_handler(name):
+    spec = importlib.util.spec_from_file_location(f"{name}_index", os.path.join(ROOT, "backend", name, "index.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed(mod):
+    with mod.get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"INSERT INTO {mod.SCHEMA}.channels (name) VALUES ('bench') RETURNING id")
+        channel_id = cur.fetchone()[0]
+        cur.execute(
+            f"""INSERT INTO {mod.SCHEMA}.articles (title, content, excerpt, channel_id, status)
+                VALUES ('bench', 'bench', 'bench', %s, 'published') RETURNING id""",
+            (channel_id,)
+        )
+        article_id = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    return article_id
+
+
+def run(mod, article_id, threads, seconds):
+    event = {"httpMethod": "GET", "path": f"/articles/{article_id}", "headers": {}}
+    done = [0] * threads
+    stop = time.monotonic() + seconds
+
+    def worker(i):
+        while time.monotonic() < stop:
+            mod.handler(event, None)
+            done[i] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    mod.VIEWS.flush_now()
+    return sum(done)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+    mod = load_handler("articles")
+    article_id = seed(mod)
+    results = {}
+    for mode in ("sync", "buffered", "async"):
+        mod.VIEWS.mode = mode
+        requests = run(mod, article_id, args.threads, args.seconds)
+        results[mode] = {"requests": requests, "rps": round(requests / args.seconds, 1)}
+    print(json.dumps({"threads": args.threads, "seconds": args.seconds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
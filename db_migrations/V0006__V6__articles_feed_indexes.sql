@@ -0,0 +1,5 @@
+CREATE INDEX IF NOT EXISTS idx_articles_feed
+    ON t_p60467862_wild_politics_portal.articles (status, is_breaking DESC, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_articles_channel_feed
+    ON t_p60467862_wild_politics_portal.articles (channel_id, status, is_breaking DESC, created_at DESC, id DESC);
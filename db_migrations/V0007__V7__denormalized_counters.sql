@@ -0,0 +1,15 @@
+ALTER TABLE t_p60467862_wild_politics_portal.articles ADD COLUMN IF NOT EXISTS comment_count INT NOT NULL DEFAULT 0;
+
+ALTER TABLE t_p60467862_wild_politics_portal.channels ADD COLUMN IF NOT EXISTS post_count INT NOT NULL DEFAULT 0;
+
+UPDATE t_p60467862_wild_politics_portal.articles a
+SET comment_count = x.n
+FROM (SELECT article_id, COUNT(*) AS n FROM t_p60467862_wild_politics_portal.comments
+      WHERE status = 'approved' GROUP BY article_id) x
+WHERE x.article_id = a.id;
+
+UPDATE t_p60467862_wild_politics_portal.channels c
+SET post_count = x.n
+FROM (SELECT channel_id, COUNT(*) AS n FROM t_p60467862_wild_politics_portal.articles
+      WHERE status = 'published' GROUP BY channel_id) x
+WHERE x.channel_id = c.id;
@@ -0,0 +1,8 @@
+ALTER TABLE t_p60467862_wild_politics_portal.articles
+    ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(content, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_articles_search
+    ON t_p60467862_wild_politics_portal.articles USING GIN (search_tsv);
@@ -0,0 +1,8 @@
+CREATE TABLE t_p60467862_wild_politics_portal.notification_dead_letters (
+    id SERIAL PRIMARY KEY,
+    channel VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT,
+    attempts INT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT NOW()
+)
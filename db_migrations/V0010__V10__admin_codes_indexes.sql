@@ -0,0 +1,8 @@
+CREATE INDEX IF NOT EXISTS idx_admin_codes_unused
+    ON t_p60467862_wild_politics_portal.admin_codes (telegram_id, created_at DESC)
+    INCLUDE (code, id, expires_at)
+    WHERE used = FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_admin_codes_used
+    ON t_p60467862_wild_politics_portal.admin_codes (id)
+    WHERE used = TRUE;
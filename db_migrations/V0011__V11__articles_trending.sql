@@ -0,0 +1,58 @@
+CREATE TABLE IF NOT EXISTS t_p60467862_wild_politics_portal.article_trending (
+    article_id INT PRIMARY KEY REFERENCES t_p60467862_wild_politics_portal.articles(id),
+    score DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_article_trending_score
+    ON t_p60467862_wild_politics_portal.article_trending (score DESC)
+    INCLUDE (created_at);
+
+CREATE TABLE IF NOT EXISTS t_p60467862_wild_politics_portal.article_trending_dirty (
+    article_id INT PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION t_p60467862_wild_politics_portal.article_trending_touch() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p60467862_wild_politics_portal.article_trending_dirty (article_id)
+    VALUES (NEW.id) ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER articles_trending_touch
+    AFTER UPDATE OF views, comment_count, status ON t_p60467862_wild_politics_portal.articles
+    FOR EACH ROW
+    WHEN (OLD.views IS DISTINCT FROM NEW.views
+          OR OLD.comment_count IS DISTINCT FROM NEW.comment_count
+          OR OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION t_p60467862_wild_politics_portal.article_trending_touch();
+
+CREATE OR REPLACE FUNCTION t_p60467862_wild_politics_portal.article_trending_refresh(batch INT)
+RETURNS TABLE (touched BIGINT, scored BIGINT, dropped BIGINT) AS $$
+    WITH dirty AS (
+        DELETE FROM t_p60467862_wild_politics_portal.article_trending_dirty
+        WHERE article_id IN (SELECT article_id FROM t_p60467862_wild_politics_portal.article_trending_dirty
+                             LIMIT batch FOR UPDATE SKIP LOCKED)
+        RETURNING article_id
+    ), upserted AS (
+        INSERT INTO t_p60467862_wild_politics_portal.article_trending (article_id, score, created_at)
+        SELECT a.id,
+               ln(1 + COALESCE(a.views, 0) + 5 * a.comment_count) + extract(epoch FROM a.created_at) / 45000,
+               a.created_at
+        FROM t_p60467862_wild_politics_portal.articles a JOIN dirty d ON d.article_id = a.id
+        WHERE a.status = 'published'
+        ON CONFLICT (article_id) DO UPDATE SET score = EXCLUDED.score, refreshed_at = NOW()
+        RETURNING article_id
+    ), removed AS (
+        DELETE FROM t_p60467862_wild_politics_portal.article_trending t USING dirty d
+        WHERE t.article_id = d.article_id AND t.article_id NOT IN (SELECT article_id FROM upserted)
+        RETURNING t.article_id
+    )
+    SELECT (SELECT COUNT(*) FROM dirty), (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM removed);
+$$ LANGUAGE sql;
+
+INSERT INTO t_p60467862_wild_politics_portal.article_trending_dirty (article_id)
+SELECT id FROM t_p60467862_wild_politics_portal.articles WHERE status = 'published'
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,5 @@
+CREATE INDEX IF NOT EXISTS idx_comments_article_status_created
+    ON t_p60467862_wild_politics_portal.comments (article_id, status, created_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_comments_status_created
+    ON t_p60467862_wild_politics_portal.comments (status, created_at, id);
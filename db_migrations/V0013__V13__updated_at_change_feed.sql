@@ -0,0 +1,13 @@
+ALTER TABLE t_p60467862_wild_politics_portal.articles ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+ALTER TABLE t_p60467862_wild_politics_portal.channels ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+UPDATE t_p60467862_wild_politics_portal.articles SET updated_at = COALESCE(created_at, NOW());
+
+UPDATE t_p60467862_wild_politics_portal.channels SET updated_at = COALESCE(created_at, NOW());
+
+CREATE INDEX IF NOT EXISTS idx_articles_updated
+    ON t_p60467862_wild_politics_portal.articles (updated_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_channels_updated
+    ON t_p60467862_wild_politics_portal.channels (updated_at, id);
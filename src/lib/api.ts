@@ -32,7 +32,7 @@ export interface Channel {
 export interface Article {
   id: number;
   title: string;
-  content: string;
+  content?: string;
   excerpt: string;
   channel_id: number;
   channel_name: string;
@@ -49,6 +49,32 @@ export interface Article {
   comment_count: number;
 }
 
+export interface ArticlePage {
+  items: Article[];
+  next_cursor: string | null;
+}
+
+export interface SearchHit extends Article {
+  rank: number;
+  snippet: string;
+}
+
+export interface ChangesPage<T> {
+  items: T[];
+  next: string;
+  has_more: boolean;
+}
+
+export interface CommentPage {
+  items: Comment[];
+  next_cursor: string | null;
+}
+
+export interface SearchPage {
+  items: SearchHit[];
+  next_offset: number | null;
+}
+
 export interface Comment {
   id: number;
   article_id: number;
@@ -94,6 +120,10 @@ export const channelsApi = {
   list: (): Promise<Channel[]> =>
     fetch(URLS.channels).then(r => r.json()),
 
+  // Без since — только стартовый токен; его запрашивают до list() и дальше применяют дельты по id
+  changes: (since?: string): Promise<ChangesPage<Channel>> =>
+    fetch(`${URLS.channels}/changes${since ? `?since=${encodeURIComponent(since)}` : ""}`).then(r => r.json()),
+
   create: (userId: number, data: { name: string; description: string; icon: string; color: string }) =>
     fetch(`${URLS.channels}/create`, {
       method: "POST",
@@ -111,9 +141,27 @@ export const channelsApi = {
 
 // ARTICLES
 export const articlesApi = {
-  list: (status = "published", channelId?: number): Promise<Article[]> => {
-    let url = `${URLS.articles}/articles?status=${status}`;
+  list: (status = "published", channelId?: number, cursor?: string, limit = 50): Promise<ArticlePage> => {
+    let url = `${URLS.articles}/articles?status=${status}&limit=${limit}`;
     if (channelId) url += `&channel_id=${channelId}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return fetch(url).then(r => r.json());
+  },
+
+  search: (q: string, offset = 0, limit = 20): Promise<SearchPage> =>
+    fetch(`${URLS.articles}/articles/search?q=${encodeURIComponent(q)}&offset=${offset}&limit=${limit}`).then(r => r.json()),
+
+  trending: (window: "day" | "week" | "month" = "day", limit = 10): Promise<{ items: Article[] }> =>
+    fetch(`${URLS.articles}/articles/trending?window=${window}&limit=${limit}`).then(r => r.json()),
+
+  // Снятые с публикации и непрошедшие модерацию статьи приходят только как {id, status}
+  changes: (since?: string): Promise<ChangesPage<Article | Pick<Article, "id" | "status">>> =>
+    fetch(`${URLS.articles}/articles/changes${since ? `?since=${encodeURIComponent(since)}` : ""}`).then(r => r.json()),
+
+  batch: (ids: number[], fields?: (keyof Article)[], countViews = false): Promise<{ items: Article[]; missing: number[] }> => {
+    let url = `${URLS.articles}/articles/batch?ids=${ids.join(",")}`;
+    if (fields?.length) url += `&fields=${fields.join(",")}`;
+    if (countViews) url += "&views=1";
     return fetch(url).then(r => r.json());
   },
 
@@ -133,15 +181,31 @@ export const articlesApi = {
       headers: headers(userId),
       body: JSON.stringify({ action, is_breaking: isBreaking }),
     }).then(r => r.json()),
+
+  moderateBatch: (userId: number, items: { id: number; action: "approve" | "reject"; is_breaking?: boolean }[]) =>
+    fetch(`${URLS.articles}/moderate/batch`, {
+      method: "PUT",
+      headers: headers(userId),
+      body: JSON.stringify({ items }),
+    }).then(r => r.json()),
 };
 
 // COMMENTS
 export const commentsApi = {
-  list: (articleId: number): Promise<Comment[]> =>
-    fetch(`${URLS.comments}?article_id=${articleId}`).then(r => r.json()),
+  list: (articleId: number, cursor?: string, limit = 50): Promise<CommentPage> => {
+    let url = `${URLS.comments}?article_id=${articleId}&limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return fetch(url).then(r => r.json());
+  },
 
-  listPending: (): Promise<Comment[]> =>
-    fetch(`${URLS.comments}?status=pending`).then(r => r.json()),
+  listPending: (cursor?: string, limit = 50): Promise<CommentPage> => {
+    let url = `${URLS.comments}?status=pending&limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return fetch(url).then(r => r.json());
+  },
+
+  previews: (articleIds: number[], limit = 3): Promise<Record<string, Comment[]>> =>
+    fetch(`${URLS.comments}/previews?article_ids=${articleIds.join(",")}&limit=${limit}`).then(r => r.json()),
 
   add: (userId: number, articleId: number, text: string) =>
     fetch(URLS.comments, {
@@ -156,4 +220,11 @@ export const commentsApi = {
       headers: headers(userId),
       body: JSON.stringify({ comment_id: commentId, action }),
     }).then(r => r.json()),
+
+  moderateBatch: (userId: number, items: { id: number; action: "approve" | "reject" }[]) =>
+    fetch(`${URLS.comments}/moderate/batch`, {
+      method: "PUT",
+      headers: headers(userId),
+      body: JSON.stringify({ items }),
+    }).then(r => r.json()),
 };
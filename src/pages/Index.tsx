@@ -43,6 +43,23 @@ function VerificationBadge({ type, label }: { type: string | null; label: string
   );
 }
 
+// Кнопка следующей страницы: видна, пока сервер отдаёт next_cursor
+function LoadMoreButton({ cursor, onLoad }: { cursor: string | null; onLoad: () => Promise<void> }) {
+  const [busy, setBusy] = useState(false);
+  if (!cursor) return null;
+  const load = async () => {
+    setBusy(true);
+    try { await onLoad(); } finally { setBusy(false); }
+  };
+  return (
+    <div className="flex justify-center mt-5">
+      <Button variant="outline" onClick={load} disabled={busy} className="font-semibold">
+        <Icon name={busy ? "Loader2" : "ChevronDown"} size={14} className={`mr-2 ${busy ? "animate-spin" : ""}`} />Показать ещё
+      </Button>
+    </div>
+  );
+}
+
 function formatDate(iso: string) {
   try {
     return new Date(iso).toLocaleDateString("ru-RU", { day: "numeric", month: "long", year: "numeric" });
@@ -56,8 +73,13 @@ export default function Index() {
   const [user, setUser] = useState<User | null>(null);
   const [channels, setChannels] = useState<Channel[]>([]);
   const [articles, setArticles] = useState<Article[]>([]);
+  const [articlesCursor, setArticlesCursor] = useState<string | null>(null);
+  const [channelArticles, setChannelArticles] = useState<Article[]>([]);
+  const [channelCursor, setChannelCursor] = useState<string | null>(null);
   const [pendingArticles, setPendingArticles] = useState<Article[]>([]);
+  const [pendingArticlesCursor, setPendingArticlesCursor] = useState<string | null>(null);
   const [pendingComments, setPendingComments] = useState<Comment[]>([]);
+  const [pendingCommentsCursor, setPendingCommentsCursor] = useState<string | null>(null);
   const [selectedArticle, setSelectedArticle] = useState<Article | null>(null);
   const [articleComments, setArticleComments] = useState<Comment[]>([]);
   const [selectedChannel, setSelectedChannel] = useState<Channel | null>(null);
@@ -100,18 +122,42 @@ export default function Index() {
 
   const loadArticles = useCallback(async () => {
     const data = await articlesApi.list("published");
-    setArticles(Array.isArray(data) ? data : []);
+    setArticles(Array.isArray(data?.items) ? data.items : []);
+    setArticlesCursor(data?.next_cursor ?? null);
   }, []);
 
+  const loadMoreArticles = async () => {
+    if (!articlesCursor) return;
+    const data = await articlesApi.list("published", undefined, articlesCursor);
+    setArticles(prev => [...prev, ...(Array.isArray(data?.items) ? data.items : [])]);
+    setArticlesCursor(data?.next_cursor ?? null);
+  };
+
   const loadModeration = useCallback(async () => {
     const [pArt, pCom] = await Promise.all([
       articlesApi.list("pending"),
       commentsApi.listPending(),
     ]);
-    setPendingArticles(Array.isArray(pArt) ? pArt : []);
-    setPendingComments(Array.isArray(pCom) ? pCom : []);
+    setPendingArticles(Array.isArray(pArt?.items) ? pArt.items : []);
+    setPendingArticlesCursor(pArt?.next_cursor ?? null);
+    setPendingComments(Array.isArray(pCom?.items) ? pCom.items : []);
+    setPendingCommentsCursor(pCom?.next_cursor ?? null);
   }, []);
 
+  const loadMorePendingArticles = async () => {
+    if (!pendingArticlesCursor) return;
+    const data = await articlesApi.list("pending", undefined, pendingArticlesCursor);
+    setPendingArticles(prev => [...prev, ...(Array.isArray(data?.items) ? data.items : [])]);
+    setPendingArticlesCursor(data?.next_cursor ?? null);
+  };
+
+  const loadMorePendingComments = async () => {
+    if (!pendingCommentsCursor) return;
+    const data = await commentsApi.listPending(pendingCommentsCursor);
+    setPendingComments(prev => [...prev, ...(Array.isArray(data?.items) ? data.items : [])]);
+    setPendingCommentsCursor(data?.next_cursor ?? null);
+  };
+
   useEffect(() => {
     Promise.all([loadChannels(), loadArticles()]).finally(() => setLoading(false));
     const stored = localStorage.getItem("ogf_user");
@@ -124,13 +170,42 @@ export default function Index() {
     if (section === "moderation" && user?.is_admin) loadModeration();
   }, [section, user, loadModeration]);
 
+  const selectedChannelId = selectedChannel?.id;
+
+  // Лента канала запрашивается с channel_id: в общей первой странице его публикаций может не быть
   useEffect(() => {
-    if (selectedArticle) {
-      commentsApi.list(selectedArticle.id).then(data => {
-        setArticleComments(Array.isArray(data) ? data : []);
+    setChannelArticles([]);
+    setChannelCursor(null);
+    if (!selectedChannelId) return;
+    let cancelled = false;
+    articlesApi.list("published", selectedChannelId).then(data => {
+      if (cancelled) return;
+      setChannelArticles(Array.isArray(data?.items) ? data.items : []);
+      setChannelCursor(data?.next_cursor ?? null);
+    });
+    return () => { cancelled = true; };
+  }, [selectedChannelId]);
+
+  const loadMoreChannelArticles = async () => {
+    if (!selectedChannelId || !channelCursor) return;
+    const data = await articlesApi.list("published", selectedChannelId, channelCursor);
+    setChannelArticles(prev => [...prev, ...(Array.isArray(data?.items) ? data.items : [])]);
+    setChannelCursor(data?.next_cursor ?? null);
+  };
+
+  const selectedArticleId = selectedArticle?.id;
+
+  useEffect(() => {
+    if (selectedArticleId) {
+      commentsApi.list(selectedArticleId).then(data => {
+        setArticleComments(Array.isArray(data?.items) ? data.items : []);
+      });
+      // Лента отдаёт только excerpt — полный текст берём из детальной страницы
+      articlesApi.get(selectedArticleId).then(data => {
+        if (data?.id === selectedArticleId) setSelectedArticle(data);
       });
     }
-  }, [selectedArticle]);
+  }, [selectedArticleId]);
 
   const saveUser = (u: User) => {
     setUser(u);
@@ -220,7 +295,7 @@ export default function Index() {
     await commentsApi.moderate(user.user_id, id, action);
     loadModeration();
     if (selectedArticle) {
-      commentsApi.list(selectedArticle.id).then(data => setArticleComments(Array.isArray(data) ? data : []));
+      commentsApi.list(selectedArticle.id).then(data => setArticleComments(Array.isArray(data?.items) ? data.items : []));
     }
   };
 
@@ -228,7 +303,7 @@ export default function Index() {
     if (!user || !commentText || !selectedArticle) return;
     await commentsApi.add(user.user_id, selectedArticle.id, commentText);
     setCommentText("");
-    commentsApi.list(selectedArticle.id).then(data => setArticleComments(Array.isArray(data) ? data : []));
+    commentsApi.list(selectedArticle.id).then(data => setArticleComments(Array.isArray(data?.items) ? data.items : []));
   };
 
   const handleVerifyChannel = async () => {
@@ -254,6 +329,9 @@ export default function Index() {
   ];
 
   const modCount = pendingArticles.length + pendingComments.length;
+  // Списки постраничные: при наличии следующей страницы счётчик показывается с «+»
+  const modCountLabel = `${modCount}${pendingArticlesCursor || pendingCommentsCursor ? "+" : ""}`;
+  const publishedCountLabel = `${articles.length}${articlesCursor ? "+" : ""}`;
   const publishedArticles = articles;
 
   return (
@@ -291,7 +369,7 @@ export default function Index() {
                 {item.label}
                 {item.key === "moderation" && modCount > 0 && (
                   <span className="absolute -top-1 -right-1 bg-red-500 text-white text-xs rounded-full w-4 h-4 flex items-center justify-center font-black leading-none">
-                    {modCount}
+                    {modCountLabel}
                   </span>
                 )}
               </button>
@@ -445,6 +523,7 @@ export default function Index() {
                     ))}
                   </div>
                 )}
+                <LoadMoreButton cursor={articlesCursor} onLoad={loadMoreArticles} />
               </div>
             )}
 
@@ -454,7 +533,7 @@ export default function Index() {
                 <div className="flex items-center gap-3 mb-6">
                   <div className="w-1 h-8 bg-gov-gold rounded-full" />
                   <h2 className="text-2xl font-black">Лента новостей</h2>
-                  <Badge className="bg-gov-navy text-gov-gold ml-2">{publishedArticles.length}</Badge>
+                  <Badge className="bg-gov-navy text-gov-gold ml-2">{publishedCountLabel}</Badge>
                 </div>
                 {publishedArticles.length === 0 ? (
                   <div className="text-center py-16 text-muted-foreground">
@@ -492,6 +571,7 @@ export default function Index() {
                     ))}
                   </div>
                 )}
+                <LoadMoreButton cursor={articlesCursor} onLoad={loadMoreArticles} />
               </div>
             )}
 
@@ -516,7 +596,7 @@ export default function Index() {
                     <span className="flex items-center gap-1.5"><Icon name="Calendar" size={14} />{formatDate(selectedArticle.created_at)}</span>
                     <span className="flex items-center gap-1.5"><Icon name="Eye" size={14} />{selectedArticle.views} просмотров</span>
                   </div>
-                  <div className="text-base leading-relaxed text-foreground/90 whitespace-pre-wrap">{selectedArticle.content}</div>
+                  <div className="text-base leading-relaxed text-foreground/90 whitespace-pre-wrap">{selectedArticle.content ?? selectedArticle.excerpt}</div>
 
                   {/* Comments */}
                   <div className="mt-10">
@@ -644,11 +724,11 @@ export default function Index() {
                   </div>
                 </div>
                 <h3 className="font-bold text-lg mb-4">Публикации канала</h3>
-                {publishedArticles.filter(a => a.channel_id === selectedChannel.id).length === 0 ? (
+                {channelArticles.length === 0 ? (
                   <p className="text-muted-foreground text-sm italic">Публикаций пока нет.</p>
                 ) : (
                   <div className="space-y-3">
-                    {publishedArticles.filter(a => a.channel_id === selectedChannel.id).map(article => (
+                    {channelArticles.map(article => (
                       <article key={article.id} onClick={() => setSelectedArticle(article)} className="bg-card border border-border rounded-xl p-5 cursor-pointer hover:shadow-md hover:border-gov-gold/40 transition-all duration-200">
                         <h4 className="font-bold mb-1.5">{article.title}</h4>
                         <p className="text-sm text-muted-foreground line-clamp-2">{article.excerpt}</p>
@@ -660,6 +740,7 @@ export default function Index() {
                     ))}
                   </div>
                 )}
+                <LoadMoreButton cursor={channelCursor} onLoad={loadMoreChannelArticles} />
               </div>
             )}
 
@@ -792,10 +873,10 @@ export default function Index() {
 
                     <div className="grid grid-cols-2 md:grid-cols-4 gap-4 mb-8">
                       {[
-                        { label: "Опубликовано", value: publishedArticles.length, icon: "CheckCircle2", bg: "bg-emerald-50 border-emerald-100", color: "text-emerald-600" },
-                        { label: "На рассмотрении", value: pendingArticles.length, icon: "Clock", bg: "bg-amber-50 border-amber-100", color: "text-amber-600" },
+                        { label: "Опубликовано", value: publishedCountLabel, icon: "CheckCircle2", bg: "bg-emerald-50 border-emerald-100", color: "text-emerald-600" },
+                        { label: "На рассмотрении", value: `${pendingArticles.length}${pendingArticlesCursor ? "+" : ""}`, icon: "Clock", bg: "bg-amber-50 border-amber-100", color: "text-amber-600" },
                         { label: "Каналов", value: channels.length, icon: "Radio", bg: "bg-blue-50 border-blue-100", color: "text-blue-600" },
-                        { label: "Комментарии", value: pendingComments.length, icon: "MessageSquare", bg: "bg-purple-50 border-purple-100", color: "text-purple-600" },
+                        { label: "Комментарии", value: `${pendingComments.length}${pendingCommentsCursor ? "+" : ""}`, icon: "MessageSquare", bg: "bg-purple-50 border-purple-100", color: "text-purple-600" },
                       ].map((s, i) => (
                         <div key={i} className={`${s.bg} border rounded-xl p-4 animate-fade-in`} style={{ animationDelay: `${i * 0.05}s` }}>
                           <Icon name={s.icon} size={20} className={`${s.color} mb-2`} />
@@ -841,6 +922,7 @@ export default function Index() {
                             </div>
                           </div>
                         ))}
+                        <LoadMoreButton cursor={pendingArticlesCursor} onLoad={loadMorePendingArticles} />
                       </div>
                     )}
 
@@ -876,6 +958,7 @@ export default function Index() {
                             </div>
                           </div>
                         ))}
+                        <LoadMoreButton cursor={pendingCommentsCursor} onLoad={loadMorePendingComments} />
                       </div>
                     )}
 